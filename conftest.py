@@ -0,0 +1,19 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_storage():
+    """Тесты не должны очищать кэш работающих серверов."""
+    from core.testing import isolated_storage
+
+    with isolated_storage():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Страницы из кэша не переживают откат базы после теста."""
+    from django.core.cache import cache
+
+    yield
+    cache.clear()
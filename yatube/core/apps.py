@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .instrumentation import instrument_connection
+        from .sqlite import configure_connection
+        connection_created.connect(configure_connection)
+        connection_created.connect(instrument_connection)
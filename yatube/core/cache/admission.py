@@ -0,0 +1,49 @@
+"""Допуск в кэш по частоте обращений, как в TinyLFU."""
+import hashlib
+import threading
+
+# Таблица для bytes.translate: каждый счётчик делится пополам.
+HALVE = bytes(value >> 1 for value in range(256))
+
+
+class FrequencySketch:
+    """Count-min sketch частот ключей с периодическим затуханием.
+
+    depth строк по width счётчиков до limit; после sample обращений
+    все счётчики делятся пополам, поэтому старая популярность
+    со временем забывается.
+    """
+
+    def __init__(self, width, depth=4, limit=15):
+        self.width = width
+        self.limit = limit
+        self.sample = width * 10
+        self._rows = [bytearray(width) for _ in range(depth)]
+        self._additions = 0
+        self._lock = threading.Lock()
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(key.encode(),
+                                 digest_size=4 * len(self._rows)).digest()
+        return [int.from_bytes(digest[start:start + 4], 'little')
+                % self.width for start in range(0, len(digest), 4)]
+
+    def increment(self, key):
+        indexes = self._indexes(key)
+        with self._lock:
+            for row, index in zip(self._rows, indexes):
+                if row[index] < self.limit:
+                    row[index] += 1
+            self._additions += 1
+            if self._additions >= self.sample:
+                self._additions //= 2
+                for row in self._rows:
+                    row[:] = row.translate(HALVE)
+
+    def estimate(self, key):
+        indexes = self._indexes(key)
+        return min(row[index] for row, index in zip(self._rows, indexes))
+
+    def admit(self, candidate, victim):
+        """Пускает кандидата на место жертвы, только если он популярнее."""
+        return self.estimate(candidate) > self.estimate(victim)
@@ -0,0 +1,198 @@
+"""Обёртка над бэкендом кэша, считающая обращения по префиксам ключей."""
+import re
+import time
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+from ..metrics import collect, quantile, registry
+
+PREFIX = re.compile(r'[A-Za-z_-]+')
+# Ключ после make_key: '<KEY_PREFIX>:<версия>:<ключ>'.
+MADE_KEY = re.compile(r'^[^:]*:\d+:')
+
+
+REPORT_COUNTERS = ('hits', 'misses', 'sets', 'bytes_written', 'evictions',
+                   'expirations', 'rejections')
+
+
+def key_prefix(key):
+    """Группа ключа: начало до первого двоеточия или другого разделителя."""
+    match = PREFIX.match(key)
+    return match.group() if match else 'other'
+
+
+def made_key_prefix(key):
+    """Группа ключа, уже прошедшего make_key бэкенда."""
+    return key_prefix(MADE_KEY.sub('', key, count=1))
+
+
+def batch_prefix(prefixes):
+    """Группа пакетной операции: общий префикс ключей или 'mixed'."""
+    return next(iter(prefixes)) if len(prefixes) == 1 else 'mixed'
+
+
+def record_lookup(tier, prefix, hits, misses):
+    if hits:
+        registry.inc('cache_hits', hits, tier=tier, prefix=prefix)
+    if misses:
+        registry.inc('cache_misses', misses, tier=tier, prefix=prefix)
+
+
+class InstrumentedCache(BaseCache):
+    """Кэш OPTIONS['BACKEND'], у которого считаются попадания и промахи,
+    записи и время операций по префиксам ключей.
+
+    Пакетные операции учитываются по префиксу каждого ключа, а их время —
+    под общим префиксом или 'mixed'. Записанные байты считает сам
+    бэкенд, который уже сериализовал значения, см. SQLiteCache.
+
+    Остальные OPTIONS, LOCATION и TIMEOUT передаются обёрнутому
+    бэкенду; неизвестные обёртке атрибуты берутся у него же.
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        backend = import_string(options.pop('BACKEND'))
+        self._cache = backend(location, {**params, 'OPTIONS': options})
+        super().__init__(params)
+
+    def __getattr__(self, name):
+        if name == '_cache':
+            raise AttributeError(name)
+        return getattr(self._cache, name)
+
+    def _timed(self, operation, prefix, started):
+        registry.observe('cache_operation_seconds',
+                         time.perf_counter() - started,
+                         operation=operation, prefix=prefix)
+
+    def _wrote(self, prefixes):
+        registry.update(counters=[
+            ('cache_sets', (('prefix', prefix), ('tier', 'shared')), amount)
+            for prefix, amount in prefixes.items()
+        ])
+
+    def get(self, key, default=None, version=None):
+        prefix = key_prefix(key)
+        started = time.perf_counter()
+        sentinel = object()
+        value = self._cache.get(key, sentinel, version)
+        self._timed('get', prefix, started)
+        hit = value is not sentinel
+        record_lookup('shared', prefix, hit, not hit)
+        return value if hit else default
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        prefixes = Counter(key_prefix(key) for key in keys)
+        started = time.perf_counter()
+        found = self._cache.get_many(keys, version)
+        self._timed('get_many', batch_prefix(prefixes), started)
+        hits = Counter(key_prefix(key) for key in found)
+        for prefix, amount in prefixes.items():
+            record_lookup('shared', prefix, hits[prefix],
+                          amount - hits[prefix])
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        prefix = key_prefix(key)
+        started = time.perf_counter()
+        self._cache.set(key, value, timeout, version)
+        self._timed('set', prefix, started)
+        self._wrote({prefix: 1})
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        prefixes = Counter(key_prefix(key) for key in data)
+        started = time.perf_counter()
+        failed = self._cache.set_many(data, timeout, version)
+        self._timed('set_many', batch_prefix(prefixes), started)
+        self._wrote(prefixes)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        prefix = key_prefix(key)
+        started = time.perf_counter()
+        added = self._cache.add(key, value, timeout, version)
+        self._timed('add', prefix, started)
+        if added:
+            self._wrote({prefix: 1})
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        prefix = key_prefix(key)
+        started = time.perf_counter()
+        try:
+            return self._cache.incr(key, delta, version)
+        finally:
+            self._timed('incr', prefix, started)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._cache.touch(key, timeout, version)
+
+    def has_key(self, key, version=None):
+        return self._cache.has_key(key, version)
+
+    def delete(self, key, version=None):
+        prefix = key_prefix(key)
+        started = time.perf_counter()
+        self._cache.delete(key, version)
+        self._timed('delete', prefix, started)
+
+    def delete_many(self, keys, version=None):
+        self._cache.delete_many(keys, version)
+
+    def clear(self):
+        self._cache.clear()
+
+    def close(self, **kwargs):
+        self._cache.close(**kwargs)
+
+
+def cache_report():
+    """Сводка метрик кэша всех воркеров по уровням и префиксам."""
+    counters, histograms = collect()
+    rows = {}
+    for (name, labels), value in counters.items():
+        if not name.startswith('cache_'):
+            continue
+        labels = dict(labels)
+        row = rows.setdefault(
+            (labels['tier'], labels['prefix']),
+            dict.fromkeys(REPORT_COUNTERS, 0))
+        if name == 'cache_evictions':
+            name = ('cache_evictions' if labels['reason'] == 'capacity'
+                    else 'cache_expirations')
+        name = name[len('cache_'):]
+        if name in row:
+            row[name] += int(value)
+    report = []
+    for (tier, prefix), row in sorted(rows.items()):
+        lookups = row['hits'] + row['misses']
+        report.append({
+            'tier': tier,
+            'prefix': prefix,
+            **row,
+            'hit_ratio': row['hits'] / lookups if lookups else None,
+            'average_bytes_written': (row['bytes_written'] / row['sets']
+                                      if row['sets'] else None),
+        })
+    latency = []
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name != 'cache_operation_seconds':
+            continue
+        count = sum(histogram[:-1])
+        latency.append({
+            **dict(labels),
+            'count': count,
+            'mean': histogram[-1] / count,
+            'p50': quantile(histogram, 0.5),
+            'p95': quantile(histogram, 0.95),
+            'p99': quantile(histogram, 0.99),
+        })
+    return {'caches': report, 'latency': latency}
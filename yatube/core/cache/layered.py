@@ -0,0 +1,242 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим кэшем."""
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import DatabaseError, close_old_connections
+
+from ..metrics import registry
+from ..sqlite import DeadlineExceeded, deadline
+from .admission import FrequencySketch
+from .instrumented import key_prefix, record_lookup
+
+logger = logging.getLogger(__name__)
+
+_refreshes = ThreadPoolExecutor(max_workers=2,
+                                thread_name_prefix='cache-refresh')
+
+
+class LocalLRU:
+    """Небольшой LRU в памяти процесса с коротким сроком жизни записей.
+
+    Срок ограничивает, насколько процесс может отстать от общего кэша,
+    если запись в нём удалили, не меняя ключ. Если задан sketch,
+    заполненный LRU пускает новую запись, только если она популярнее
+    вытесняемой; популярность считается по identity записи.
+    """
+
+    def __init__(self, size, timeout, sketch=None):
+        self.size = size
+        self.timeout = timeout
+        self.sketch = sketch
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value, identity = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                registry.inc('cache_evictions', tier='local',
+                             prefix=key_prefix(key), reason='expired')
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, identity=None):
+        identity = identity or key
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.size:
+                victim = next(iter(self._entries.values()))[2]
+                if self.sketch is not None and not self.sketch.admit(
+                        identity, victim):
+                    registry.inc('cache_rejections', tier='local',
+                                 prefix=key_prefix(key))
+                    return False
+                evicted, _ = self._entries.popitem(last=False)
+                registry.inc('cache_evictions', tier='local',
+                             prefix=key_prefix(evicted), reason='capacity')
+            self._entries[key] = (time.monotonic() + self.timeout, value,
+                                  identity)
+            self._entries.move_to_end(key)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TwoTierCache:
+    """Локальный LRU перед общим кэшем с защитой от лавины пересборок.
+
+    Значения хранятся в pickle вместе с моментом, до которого они свежие:
+    каждый запрос получает свою копию объекта, и обоим уровням не нужно
+    сериализовать его заново. Жёсткий срок записи — timeout общего кэша,
+    мягкий — soft_timeout: после него запись отдаётся сразу, а новая
+    собирается в фоне.
+
+    Пересобирает запись только владелец блокировки в общем кэше.
+    Остальные сразу отдают предыдущее значение по stale_key, а если
+    его нет — ждут не дольше wait и собирают запись сами. Если при
+    сборке база падает или не укладывается в budget секунд, отдаётся
+    предыдущее значение, пропущенное через degraded.
+
+    Частота обращений к страницам (stale_key, иначе key) считается
+    в sketch. По ней LRU выбирает, что держать, а в общий кэш, который
+    сообщает через has_room() о нехватке места, попадают только записи,
+    запрошенные не меньше admit_after раз: разовые ключи не вытесняют
+    популярные страницы.
+    """
+
+    def __init__(self, cache, local_size, local_timeout, lock_timeout,
+                 wait, soft_timeout=None, budget=None, poll=0.02,
+                 executor=_refreshes, sketch_width=4096, admit_after=2):
+        self.cache = cache
+        self.sketch = FrequencySketch(sketch_width)
+        self.admit_after = admit_after
+        self.local = LocalLRU(local_size, local_timeout, self.sketch)
+        self.lock_timeout = lock_timeout
+        self.wait = wait
+        self.soft_timeout = soft_timeout
+        self.budget = budget
+        self.poll = poll
+        self.executor = executor
+
+    def _entry(self, key, identity=None):
+        blob = self.local.get(key)
+        record_lookup('local', key_prefix(key), blob is not None,
+                      blob is None)
+        if blob is None:
+            blob = self.cache.get(key)
+            if blob is None:
+                return None
+            self.local.set(key, blob, identity)
+        return pickle.loads(blob)
+
+    def get(self, key):
+        entry = self._entry(key)
+        return None if entry is None else entry[1]
+
+    def set(self, key, value, timeout, stale_key=None):
+        fresh_until = None
+        if self.soft_timeout is not None:
+            fresh_until = time.time() + self.soft_timeout
+        blob = pickle.dumps((fresh_until, value), pickle.HIGHEST_PROTOCOL)
+        identity = stale_key or key
+        self.local.set(key, blob, identity)
+        if not self._admitted(identity):
+            registry.inc('cache_rejections', tier='shared',
+                         prefix=key_prefix(key))
+            return
+        data = {key: blob}
+        if stale_key is not None:
+            # Предыдущее значение — ссылка на последний собранный ключ:
+            # сама запись уже лежит в кэше и не дублируется.
+            data[stale_key] = key
+        self.cache.set_many(data, timeout)
+
+    def _admitted(self, identity):
+        has_room = getattr(self.cache, 'has_room', None)
+        return (has_room is None or has_room()
+                or self.sketch.estimate(identity) >= self.admit_after)
+
+    def get_stale(self, stale_key):
+        key = self.cache.get(stale_key)
+        return None if key is None else self.get(key)
+
+    def get_or_build(self, key, build, timeout, stale_key=None,
+                     cacheable=None, degraded=None):
+        """Возвращает значение по key, собирая его не более одного раза.
+
+        cacheable решает, сохранять ли собранное значение; по умолчанию
+        сохраняется любое. degraded(value, reason) получает предыдущее
+        значение, которое отдаётся вместо упавшей сборки, и причину:
+        'timeout' или 'error'.
+        """
+        store = (key, timeout, stale_key, cacheable)
+        self.sketch.increment(stale_key or key)
+        entry = self._entry(key, stale_key)
+        if entry is not None:
+            fresh_until, value = entry
+            if fresh_until is not None and fresh_until <= time.time():
+                self._refresh(build, store)
+            return value
+        token = self._acquire(key)
+        if token is None:
+            value = self._await(key, stale_key)
+            if value is not None:
+                return value
+        try:
+            return self._build(build, store, degraded)
+        finally:
+            self._release(key, token)
+
+    def _build(self, build, store, degraded):
+        key, timeout, stale_key, cacheable = store
+        fallback = stale_key is not None and self.cache.has_key(stale_key)
+        if not fallback or self.budget is None:
+            value = build()
+        else:
+            try:
+                with deadline(self.budget):
+                    value = build()
+            except DatabaseError as error:
+                value = self.get_stale(stale_key)
+                if value is None:
+                    raise
+                reason = ('timeout' if isinstance(error, DeadlineExceeded)
+                          else 'error')
+                logger.warning('Отдана предыдущая версия %s (%s): %s',
+                               key, reason, error)
+                return value if degraded is None else degraded(value, reason)
+        if cacheable is None or cacheable(value):
+            self.set(key, value, timeout, stale_key)
+        return value
+
+    def _refresh(self, build, store):
+        key = store[0]
+        token = self._acquire(key)
+        if token is None:
+            return
+
+        def refresh():
+            try:
+                self._build(build, store, None)
+            except Exception:
+                logger.exception('Не удалось обновить %s', key)
+            finally:
+                self._release(key, token)
+                close_old_connections()
+
+        self.executor.submit(refresh)
+
+    def _acquire(self, key):
+        token = uuid.uuid4().hex
+        if self.cache.add(f'lock:{key}', token, self.lock_timeout):
+            return token
+        return None
+
+    def _release(self, key, token):
+        lock = f'lock:{key}'
+        if token is not None and self.cache.get(lock) == token:
+            self.cache.delete(lock)
+
+    def _await(self, key, stale_key):
+        if stale_key is not None:
+            value = self.get_stale(stale_key)
+            if value is not None:
+                return value
+        until = time.monotonic() + self.wait
+        while time.monotonic() < until:
+            time.sleep(self.poll)
+            value = self.get(key)
+            if value is not None or not self.cache.has_key(f'lock:{key}'):
+                return value
+        return None
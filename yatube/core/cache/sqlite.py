@@ -0,0 +1,256 @@
+"""Кэш в файле SQLite, общий для всех процессов на одной машине."""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from ..metrics import registry
+from .instrumented import made_key_prefix
+
+# Ограничение SQLite на число параметров в одном запросе.
+MAX_VARIABLES = 999
+# Раз в сколько записей процесс проверяет размер кэша.
+CULL_EVERY = 100
+# При какой заполненности has_room() сообщает, что места нет.
+FULL = 0.9
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+'''
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA mmap_size = 67108864',
+)
+ALIVE = '(expires IS NULL OR expires > ?)'
+
+
+def _chunks(items, size=MAX_VARIABLES - 1):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    """Кэш Django в файле LOCATION.
+
+    У каждого потока своё соединение, после fork оно открывается заново.
+    Целые числа хранятся как INTEGER, поэтому incr — атомарный UPDATE
+    в самой базе; остальные значения — pickle в BLOB. Просроченные записи
+    не возвращаются и вычищаются при проверке размера кэша. Вытеснения
+    и записанные байты учитываются в метриках по префиксам ключей.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+        self._size = None
+
+    @property
+    def _db(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self._path, isolation_level=None,
+                                         check_same_thread=False)
+            for pragma in PRAGMAS:
+                connection.execute(pragma)
+            connection.executescript(SCHEMA)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _encode(self, value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        row = self._db.execute(
+            f'SELECT value FROM cache WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        return default if row is None else self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        names = {self._key(key, version): key for key in keys}
+        found = {}
+        now = time.time()
+        for chunk in _chunks(list(names)):
+            rows = self._db.execute(
+                f'SELECT key, value FROM cache WHERE key IN '
+                f'({", ".join("?" * len(chunk))}) AND {ALIVE}',
+                (*chunk, now),
+            )
+            for name, value in rows:
+                found[names[name]] = self._decode(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        row = (self._key(key, version), self._encode(value),
+               self.get_backend_timeout(timeout))
+        self._db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)', row)
+        _record_written([row])
+        self._wrote()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [(self._key(key, version), self._encode(value), expires)
+                for key, value in data.items()]
+        db = self._db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', rows)
+        _record_written(rows)
+        self._wrote(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        row = (key, self._encode(value), self.get_backend_timeout(timeout))
+        db = self._db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            db.execute(f'DELETE FROM cache WHERE key = ? AND NOT {ALIVE}',
+                       (key, time.time()))
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', row).rowcount
+        if added:
+            _record_written([row])
+        self._wrote()
+        return bool(added)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._db
+        with db:
+            db.execute('BEGIN IMMEDIATE')
+            updated = db.execute(
+                f'UPDATE cache SET value = value + ? WHERE key = ? '
+                f'AND typeof(value) = \'integer\' AND {ALIVE}',
+                (delta, key, time.time()),
+            ).rowcount
+            if not updated:
+                raise ValueError(f"Key '{key}' not found")
+            return db.execute('SELECT value FROM cache WHERE key = ?',
+                              (key,)).fetchone()[0]
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._db.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()),
+        ).rowcount)
+
+    def has_key(self, key, version=None):
+        return self._db.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time()),
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self._db.execute('DELETE FROM cache WHERE key = ?',
+                         (self._key(key, version),))
+
+    def delete_many(self, keys, version=None):
+        names = [self._key(key, version) for key in keys]
+        for chunk in _chunks(names):
+            self._db.execute(
+                f'DELETE FROM cache WHERE key IN '
+                f'({", ".join("?" * len(chunk))})', chunk)
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+        self._size = 0
+
+    def has_room(self):
+        """Хватает ли места без вытеснения других записей.
+
+        Размер оценивается сверху: он пересчитывается при проверке
+        размера кэша и растёт с каждой записью этого процесса.
+        """
+        if self._size is None:
+            self._size = self._db.execute(
+                'SELECT count(*) FROM cache').fetchone()[0]
+        return self._size < self._max_entries * FULL
+
+    def _wrote(self, amount=1):
+        if self._size is not None:
+            self._size += amount
+        self._writes += amount
+        if self._writes >= CULL_EVERY:
+            self._writes = 0
+            self._cull()
+
+    def _cull(self):
+        """Удаляет просроченное, а при переполнении — часть записей.
+
+        Вытесняются записи, которые истекут раньше остальных,
+        как в culling у DatabaseCache. Удалённые ключи учитываются
+        в метриках по префиксам.
+        """
+        db = self._db
+        expired = db.execute('DELETE FROM cache WHERE expires <= ? '
+                             'RETURNING key', (time.time(),)).fetchall()
+        _record_removed(expired, 'expired')
+        count = db.execute('SELECT count(*) FROM cache').fetchone()[0]
+        if count > self._max_entries and not self._cull_frequency:
+            _record_removed(db.execute('SELECT key FROM cache'), 'capacity')
+            self.clear()
+            count = 0
+        elif count > self._max_entries:
+            culled = db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?) RETURNING key',
+                (count // self._cull_frequency,)).fetchall()
+            _record_removed(culled, 'capacity')
+            count -= len(culled)
+        self._size = count
+
+
+def _record_written(rows):
+    """Байты, записанные в базу: pickle значения или 8 байт INTEGER."""
+    written = Counter()
+    for key, value, _ in rows:
+        written[made_key_prefix(key)] += (
+            8 if isinstance(value, int) else len(value))
+    registry.update(counters=[
+        ('cache_bytes_written', (('prefix', prefix), ('tier', 'shared')),
+         amount) for prefix, amount in written.items()
+    ])
+
+
+def _record_removed(rows, reason):
+    removed = Counter(made_key_prefix(key) for key, in rows)
+    for prefix, amount in removed.items():
+        registry.inc('cache_evictions', amount, tier='shared',
+                     prefix=prefix, reason=reason)
@@ -0,0 +1,66 @@
+"""Персональные вставки в страницы, общие для всех пользователей.
+
+Страница рендерится в два прохода. В первом тег hole оставляет вместо
+вставки метку и запоминает шаблон с аргументами; разметка с метками
+кэшируется одна на всех. Во втором проходе fill отрисовывает вставки
+для текущего запроса.
+"""
+import re
+import secrets
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+MARKER = '<!--hole:{token}:{index}-->'
+PATTERN = re.compile(rb'<!--hole:([0-9a-f]+):(\d+)-->')
+
+
+class Holes:
+    """Вставки, отложенные при первом проходе рендера страницы.
+
+    Случайный token не даёт принять за метку похожий текст из постов.
+    """
+
+    def __init__(self):
+        self.token = secrets.token_hex(8)
+        self.holes = []
+
+    def punch(self, template_name, context):
+        self.holes.append((template_name, context))
+        return mark_safe(MARKER.format(token=self.token,
+                                       index=len(self.holes) - 1))
+
+
+def render_hole(template_name, context, request):
+    """Отрисовывает вставку с аргументами тега и контекстом запроса."""
+    return render_to_string(template_name, context, request)
+
+
+def render_shared(view, request, *args, **kwargs):
+    """Первый проход: вызывает view, откладывая вставки в response.holes."""
+    request.holes = Holes()
+    try:
+        response = view(request, *args, **kwargs)
+    finally:
+        holes = request.holes
+        del request.holes
+    response.holes = holes
+    return response
+
+
+def fill(response, request):
+    """Второй проход: рендерит вставки для текущего пользователя."""
+    holes = getattr(response, 'holes', None)
+    if not holes or not holes.holes:
+        return response
+    token = holes.token.encode()
+
+    def replace(match):
+        if match.group(1) != token:
+            return match.group(0)
+        template_name, context = holes.holes[int(match.group(2))]
+        return render_hole(template_name, context,
+                           request).encode(response.charset)
+
+    response.content = PATTERN.sub(replace, response.content)
+    return response
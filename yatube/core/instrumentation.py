@@ -0,0 +1,200 @@
+"""Замеры одного запроса: SQL-запросы и рендер шаблонов.
+
+RequestMetricsMiddleware кладёт RequestStats в поток на время запроса.
+Обёртка запросов ставится на каждое новое соединение, а шаблоны
+отрисовывает бэкенд InstrumentedTemplates; вне запроса они ничего
+не делают.
+
+Запросы дольше SLOW_QUERY_THRESHOLD секунд пишутся в лог всегда,
+а одинаковый SQL, выполненный в запросе N_PLUS_ONE_THRESHOLD раз
+и больше, — как подозрение на N+1. В обоих случаях указывается view
+и место вызова: строка кода проекта и узел шаблона.
+
+Рендер выбранных для профилирования запросов разбирает
+core.profiling.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from functools import partial
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+from django.template.base import Node
+
+from . import profiling
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_RENDER_NODE = Node.render_annotated.__code__
+# Сколько параметров показывать в логе до сокращения.
+SHAPE_LIMIT = 5
+
+
+class RequestStats:
+    __slots__ = ('request', 'queries', 'query_seconds', 'template_seconds',
+                 'rendering', 'statements', 'profile')
+
+    def __init__(self, request=None):
+        self.request = request
+        self.profile = profiling.sampled()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.template_seconds = 0.0
+        self.rendering = False
+        # SQL -> [сколько раз, суммарное время, место вызова].
+        self.statements = {}
+
+
+def current():
+    """Замеры текущего запроса или None вне запроса."""
+    return getattr(_local, 'stats', None)
+
+
+def start(request=None):
+    _local.stats = RequestStats(request)
+    return _local.stats
+
+
+def stop():
+    _local.stats = None
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+def call_site():
+    """Ближайшие к запросу строка кода проекта и узел шаблона."""
+    code_site = template_site = None
+    root = settings.BASE_DIR + os.sep
+    frame = sys._getframe(1)
+    while frame is not None and not (code_site and template_site):
+        code = frame.f_code
+        if code is _RENDER_NODE:
+            if template_site is None:
+                node = frame.f_locals['self']
+                origin = node.origin
+                template_site = (
+                    f'{origin.template_name or origin.name}:'
+                    f'{node.token.lineno} → {node.token.contents}')
+        elif (code_site is None and code.co_filename.startswith(root)
+                and code.co_filename != __file__):
+            code_site = (f'{os.path.relpath(code.co_filename, root)}:'
+                         f'{frame.f_lineno} in {code.co_name}')
+        frame = frame.f_back
+    return ', '.join(site for site in (code_site, template_site) if site)
+
+
+def params_shape(params, many=False):
+    """Типы параметров без значений: в лог не попадают данные."""
+    if many:
+        params = list(params)
+        first = params_shape(params[0]) if params else '()'
+        return f'{len(params)} × {first}'
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{%s}' % ', '.join(
+            f'{name}: {type(value).__name__}'
+            for name, value in params.items())
+    names = [type(value).__name__ for value in params]
+    if len(names) > SHAPE_LIMIT and len(set(names)) == 1:
+        return f'({names[0]} × {len(names)})'
+    return f'({", ".join(names)})'
+
+
+def _log_slow(stats, sql, params, many, elapsed):
+    view = view_name(stats.request) if stats else '-'
+    registry.inc('db_slow_queries', view=view)
+    logger.warning(
+        'Медленный запрос: %.1f мс, view %s, вызван из %s\n'
+        '%s\nпараметры: %s',
+        elapsed * 1000, view, call_site() or '-', sql,
+        params_shape(params, many))
+
+
+def record_queries(execute, sql, params, many, context):
+    stats = getattr(_local, 'stats', None)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+            seen = stats.statements.get(sql)
+            if seen is None:
+                stats.statements[sql] = [1, elapsed, None]
+            else:
+                seen[0] += 1
+                seen[1] += elapsed
+                if seen[0] == settings.N_PLUS_ONE_THRESHOLD:
+                    # Повтор обычно идёт из того же цикла, поэтому место
+                    # вызова берётся один раз.
+                    seen[2] = call_site()
+        if elapsed >= settings.SLOW_QUERY_THRESHOLD:
+            _log_slow(stats, sql, params, many, elapsed)
+
+
+def report_repeated(stats):
+    """Пишет в лог SQL, повторённый в запросе подозрительно часто."""
+    view = None
+    for sql, (count, seconds, site) in stats.statements.items():
+        if count < settings.N_PLUS_ONE_THRESHOLD:
+            continue
+        view = view or view_name(stats.request)
+        registry.inc('db_repeated_queries', view=view)
+        logger.warning(
+            'Возможный N+1: %d одинаковых запросов за %.1f мс, view %s, '
+            'вызван из %s\n%s', count, seconds * 1000, view, site or '-',
+            sql)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """Обработчик connection_created: считает запросы соединения.
+
+    Объект соединения переживает переподключения, поэтому обёртка
+    добавляется один раз.
+    """
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        stats = getattr(_local, 'stats', None)
+        if stats is None or stats.rendering:
+            # Вложенные шаблоны уже входят во время внешнего.
+            return super().render(context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            if stats.profile:
+                return profiling.profile(
+                    partial(super().render, context, request),
+                    view_name(stats.request))
+            return super().render(context, request)
+        finally:
+            stats.template_seconds += time.perf_counter() - started
+            stats.rendering = False
+
+
+class InstrumentedTemplates(django_backend.DjangoTemplates):
+    """DjangoTemplates, который считает время рендера в запросе."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
@@ -0,0 +1,42 @@
+import time
+
+from core.metrics import registry
+from core.middleware import RequestMetricsMiddleware
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+
+
+class Command(BaseCommand):
+    help = ('Измеряет, сколько RequestMetricsMiddleware добавляет '
+            'к запросу: view без работы вызывается напрямую и через '
+            'middleware. Цель — меньше 50 мкс на запрос.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        response = HttpResponse(b'x' * 1000)
+
+        def view(request):
+            return response
+
+        middleware = RequestMetricsMiddleware(view)
+        rounds = options['requests']
+        timings = {}
+        # Замеры бенчмарка не должны попасть в метрики сервера.
+        with override_settings(METRICS_FLUSH_INTERVAL=float('inf')):
+            for title, handler in (('без middleware', view),
+                                   ('с middleware', middleware)):
+                # Прогрев: первое обращение создаёт записи в реестре.
+                handler(request)
+                started = time.perf_counter()
+                for _ in range(rounds):
+                    handler(request)
+                timings[title] = (time.perf_counter() - started) / rounds
+        registry.clear()
+        overhead = timings['с middleware'] - timings['без middleware']
+        self.stdout.write(f'Накладные расходы: {overhead * 1e6:.1f} мкс '
+                          f'на запрос ({rounds} запросов)')
@@ -0,0 +1,109 @@
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from core.sqlite import apply_pragmas
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from posts.models import Comment, Post
+
+# Настройки SQLite до тюнинга: журнал отката и полная синхронизация.
+ROLLBACK_JOURNAL = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность копии базы с журналом '
+            'отката и с SQLITE_PRAGMAS при параллельной записи и чтении.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite.')
+        post = Post.objects.order_by('-pub_date').first()
+        if post is None:
+            raise CommandError('В базе нет постов: '
+                               'сначала запустите generate_dataset.')
+        listing = Post.objects.select_related('author', 'group').order_by(
+            '-pub_date', '-id')[:10]
+        read_sql, read_params = listing.query.sql_with_params()
+        write_sql = (
+            f'INSERT INTO {Comment._meta.db_table} '
+            f'(post_id, author_id, text, pub_date) VALUES (?, ?, ?, ?)')
+        write_params = (post.id, post.author_id, 'Комментарий бенчмарка')
+        self.queries = (read_sql.replace('%s', '?'), read_params,
+                        write_sql, write_params)
+        self.stdout.write(
+            f'{"режим":<22}{"записей/с":>11}{"чтений/с":>11}'
+            f'{"ошибок":>9}{"p95 записи, мс":>16}')
+        for title, pragmas in (('журнал отката', ROLLBACK_JOURNAL),
+                               ('SQLITE_PRAGMAS', settings.SQLITE_PRAGMAS)):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'benchmark.sqlite3')
+                source = sqlite3.connect(primary.settings_dict['NAME'])
+                target = sqlite3.connect(path)
+                source.backup(target)
+                source.close()
+                target.close()
+                self.run(title, path, pragmas, options)
+
+    def run(self, title, path, pragmas, options):
+        read_sql, read_params, write_sql, write_params = self.queries
+        stop = time.perf_counter() + options['seconds']
+        lock = threading.Lock()
+        totals = {'reads': 0, 'writes': 0, 'errors': 0, 'latency': []}
+
+        def worker(writes):
+            database = sqlite3.connect(path, check_same_thread=False)
+            apply_pragmas(database.cursor(), pragmas)
+            done = errors = 0
+            latency = []
+            while time.perf_counter() < stop:
+                started = time.perf_counter()
+                try:
+                    if writes:
+                        database.execute(
+                            write_sql,
+                            (*write_params, str(timezone.now().replace(
+                                tzinfo=None))))
+                        database.commit()
+                    else:
+                        database.execute(read_sql, read_params).fetchall()
+                except sqlite3.OperationalError:
+                    database.rollback()
+                    errors += 1
+                    continue
+                done += 1
+                if writes:
+                    latency.append(time.perf_counter() - started)
+            database.close()
+            with lock:
+                totals['writes' if writes else 'reads'] += done
+                totals['errors'] += errors
+                totals['latency'] += latency
+
+        threads = [
+            threading.Thread(target=worker, args=(writes,))
+            for writes in ([True] * options['writers']
+                           + [False] * options['readers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = options['seconds']
+        latency = sorted(totals['latency']) or [0]
+        p95 = latency[max(math.ceil(len(latency) * 0.95) - 1, 0)]
+        self.stdout.write(
+            f'{title:<22}{totals["writes"] / seconds:>11.0f}'
+            f'{totals["reads"] / seconds:>11.0f}{totals["errors"]:>9}'
+            f'{p95 * 1000:>16.1f}')
@@ -0,0 +1,55 @@
+import json
+
+from core.cache.instrumented import cache_report
+from core.metrics import reset
+from django.core.management.base import BaseCommand
+
+
+def _microseconds(seconds):
+    return '-' if seconds is None else f'{seconds * 1e6:.0f}'
+
+
+class Command(BaseCommand):
+    help = ('Показывает попадания, промахи, записи, вытеснения и время '
+            'операций кэша по префиксам ключей, собранные со всех '
+            'воркеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести сводку в JSON.')
+        parser.add_argument('--reset', action='store_true',
+                            help='Удалить накопленные метрики.')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            reset()
+            self.stdout.write(self.style.SUCCESS('Метрики сброшены'))
+            return
+        report = cache_report()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(
+            f'{"уровень":<8}{"префикс":<16}{"попаданий":>11}'
+            f'{"промахов":>10}{"доля":>7}{"записей":>9}{"байт/запись":>12}'
+            f'{"вытеснено":>11}{"истекло":>9}{"не допущено":>13}')
+        for row in report['caches']:
+            ratio = ('-' if row['hit_ratio'] is None
+                     else f'{row["hit_ratio"]:.0%}')
+            size = ('-' if row['average_bytes_written'] is None
+                    else f'{row["average_bytes_written"]:.0f}')
+            self.stdout.write(
+                f'{row["tier"]:<8}{row["prefix"]:<16}{row["hits"]:>11}'
+                f'{row["misses"]:>10}{ratio:>7}{row["sets"]:>9}{size:>12}'
+                f'{row["evictions"]:>11}{row["expirations"]:>9}'
+                f'{row["rejections"]:>13}')
+        self.stdout.write(
+            f'\n{"операция":<12}{"префикс":<16}{"вызовов":>9}'
+            f'{"среднее, мкс":>14}{"p50":>8}{"p95":>8}{"p99":>8}')
+        for row in report['latency']:
+            self.stdout.write(
+                f'{row["operation"]:<12}{row["prefix"]:<16}'
+                f'{row["count"]:>9}{_microseconds(row["mean"]):>14}'
+                f'{_microseconds(row["p50"]):>8}'
+                f'{_microseconds(row["p95"]):>8}'
+                f'{_microseconds(row["p99"]):>8}')
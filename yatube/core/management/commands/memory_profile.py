@@ -0,0 +1,41 @@
+import json
+
+from core.memory import clear, entries, summary
+from django.core.management.base import BaseCommand
+
+
+def _kilobytes(size):
+    return f'{size / 1024:.0f}'
+
+
+class Command(BaseCommand):
+    help = ('Показывает пик и оставшуюся к концу запроса память, а также '
+            'крупнейшие места выделения по view. Профилируется доля '
+            'запросов MEMORY_PROFILE_RATE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Имя view, например posts:index.')
+        parser.add_argument('--top', type=int, default=5,
+                            help='Сколько мест выделения показать.')
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести сохранённые профили в JSON.')
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить сохранённые профили.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear()
+            self.stdout.write(self.style.SUCCESS('Профили удалены'))
+            return
+        if options['json']:
+            self.stdout.write(json.dumps(entries(options['view']), indent=2))
+            return
+        for row in summary(options['view'], options['top']):
+            self.stdout.write(
+                f'{row["view"]}: профилей {row["samples"]}, пик до '
+                f'{_kilobytes(row["peak_max"])} КБ, в среднем '
+                f'{_kilobytes(row["peak_mean"])} КБ, остаётся '
+                f'{_kilobytes(row["retained_mean"])} КБ')
+            for site, size, count in row['sites']:
+                self.stdout.write(f'  {_kilobytes(size):>8} КБ '
+                                  f'{count:>8.0f} блоков  {site}')
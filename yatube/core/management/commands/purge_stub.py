@@ -0,0 +1,20 @@
+from core.purge import StubPurgeServer
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Запускает заглушку кэширующего прокси, которая печатает '
+            'полученные инвалидации. Укажите её адрес в YATUBE_PURGE_URL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8081)
+
+    def handle(self, *args, **options):
+        stub = StubPurgeServer(options['host'], options['port'],
+                               on_purge=self.report)
+        self.stdout.write(f'Инвалидации принимаются на {stub.url}')
+        stub.serve_forever()
+
+    def report(self, keys):
+        self.stdout.write(f'{len(keys)} ключей: {" ".join(keys)}')
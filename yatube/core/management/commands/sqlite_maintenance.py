@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+INCREMENTAL = 2
+
+
+class Command(BaseCommand):
+    help = ('Обслуживание SQLite: ANALYZE, инкрементальный VACUUM '
+            'и контрольная точка WAL. Запускайте по расписанию, '
+            'например из cron раз в час.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument(
+            '--vacuum-pages', type=int, default=1000,
+            help='Сколько свободных страниц вернуть за запуск; 0 — все.')
+        parser.add_argument(
+            '--enable-incremental', action='store_true',
+            help='Включить auto_vacuum=INCREMENTAL. Требует полного '
+                 'VACUUM и блокирует базу на время его работы.')
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять обслуживание каждые N секунд.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда работает только с SQLite.')
+        while True:
+            with connection.cursor() as cursor:
+                self.maintain(cursor, options)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def maintain(self, cursor, options):
+        def pragma(statement):
+            cursor.execute(f'PRAGMA {statement}')
+            return cursor.fetchone()
+
+        started = time.perf_counter()
+        cursor.execute('ANALYZE')
+        self.stdout.write('ANALYZE выполнен')
+
+        free_before = pragma('freelist_count')[0]
+        incremental = pragma('auto_vacuum')[0] == INCREMENTAL
+        if options['enable_incremental'] and not incremental:
+            pragma('auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+            self.stdout.write('auto_vacuum=INCREMENTAL включён')
+            incremental = True
+        if incremental:
+            pages = options['vacuum_pages']
+            # SQLite сам трактует 0 как «все свободные страницы».
+            cursor.execute(f'PRAGMA incremental_vacuum({pages})')
+            cursor.fetchall()
+            self.stdout.write(
+                f'Свободных страниц: {free_before} -> '
+                f'{pragma("freelist_count")[0]}')
+        elif free_before:
+            self.stdout.write(self.style.WARNING(
+                f'Свободных страниц: {free_before}, но auto_vacuum '
+                f'выключен; запустите с --enable-incremental'))
+
+        if pragma('journal_mode')[0] == 'wal':
+            busy, log, done = pragma('wal_checkpoint(TRUNCATE)')
+            state = 'не завершена' if busy else 'выполнена'
+            self.stdout.write(
+                f'Контрольная точка WAL {state}: '
+                f'перенесено {done} из {log} страниц')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обслуживание завершено за '
+            f'{time.perf_counter() - started:.2f} с'))
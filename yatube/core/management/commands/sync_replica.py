@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файл реплики '
+            'через backup API, не останавливая запись.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--to', default=settings.REPLICA_DATABASE_PATH,
+            help='Файл реплики; по умолчанию YATUBE_REPLICA_DB.')
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять копирование каждые N секунд.')
+
+    def handle(self, *args, **options):
+        primary = connections['default'].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('Реплика-копия поддерживается только '
+                               'для SQLite.')
+        target = options['to']
+        if not target:
+            raise CommandError('Укажите файл реплики через --to '
+                               'или YATUBE_REPLICA_DB.')
+        while True:
+            started = time.perf_counter()
+            self.copy(primary['NAME'], target)
+            self.stdout.write(self.style.SUCCESS(
+                f'Реплика {target} обновлена за '
+                f'{time.perf_counter() - started:.2f} с'))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    @staticmethod
+    def copy(source, target):
+        # Копия собирается во временном файле и подменяет реплику
+        # атомарно: открытые соединения дочитывают старый файл.
+        temporary = f'{target}.tmp'
+        primary = sqlite3.connect(source)
+        replica = sqlite3.connect(temporary)
+        try:
+            primary.backup(replica)
+            replica.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            replica.close()
+            primary.close()
+        os.replace(temporary, target)
@@ -0,0 +1,26 @@
+from core.profiling import folded, summary
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Показывает, сколько времени рендера уходит на шаблоны, '
+            'include и теги каждого view, по данным всех воркеров. '
+            'Профилируется доля запросов TEMPLATE_PROFILE_RATE.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--view', help='Имя view, например posts:index.')
+        parser.add_argument('--folded', action='store_true',
+                            help='Вывести стеки для flamegraph.pl.')
+        parser.add_argument('--calls', action='store_true',
+                            help='В стеках вместо времени — число вызовов.')
+
+    def handle(self, *args, **options):
+        if options['folded'] or options['calls']:
+            for line in folded(options['view'], options['calls']):
+                self.stdout.write(line)
+            return
+        self.stdout.write(f'{"view":<20}{"часть страницы":<50}'
+                          f'{"всего, мс":>11}{"вызовов":>9}')
+        for view, label, seconds, calls in summary(options['view']):
+            self.stdout.write(f'{view:<20}{label[:49]:<50}'
+                              f'{seconds * 1000:>11.2f}{calls:>9}')
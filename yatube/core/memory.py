@@ -0,0 +1,122 @@
+"""Профили памяти отдельных запросов.
+
+Профили лежат в кольцевом буфере из MEMORY_PROFILE_ENTRIES записей
+в общем кэше: номер следующей ячейки — атомарный incr, поэтому буфер
+один на все воркеры, а самые старые записи перезаписываются.
+"""
+import os
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import instrumentation, profiling
+
+PREFIX = 'memory_profile'
+NEXT = f'{PREFIX}:next'
+
+
+def sampled():
+    rate = settings.MEMORY_PROFILE_RATE
+    return rate >= 1 or rate > 0 and random.random() < rate
+
+
+def _location(filename):
+    root = settings.BASE_DIR + os.sep
+    if filename.startswith(root):
+        return os.path.relpath(filename, root)
+    # Для библиотек — путь внутри site-packages или стандартной
+    # библиотеки, например django/db/models/query.py.
+    head, _, tail = filename.rpartition('site-packages' + os.sep)
+    return tail if head else os.path.basename(filename)
+
+
+def allocation_sites(snapshot, limit):
+    """Самые крупные места выделения памяти, оставшейся к концу запроса.
+
+    Место — ближайшая к выделению строка кода проекта, кроме обёрток
+    замеров, а если её нет в сохранённых кадрах — сама строка выделения.
+    """
+    root = settings.BASE_DIR + os.sep
+    wrappers = {instrumentation.__file__, profiling.__file__}
+    sizes = defaultdict(lambda: [0, 0])
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ])
+    for statistic in snapshot.statistics('traceback'):
+        frames = statistic.traceback
+        frame = next((frame for frame in reversed(frames)
+                      if frame.filename.startswith(root)
+                      and frame.filename not in wrappers), frames[-1])
+        site = sizes[f'{_location(frame.filename)}:{frame.lineno}']
+        site[0] += statistic.size
+        site[1] += statistic.count
+    top = sorted(sizes.items(), key=lambda item: -item[1][0])[:limit]
+    return [[site, size, count] for site, (size, count) in top]
+
+
+def record(view, request, response, peak, retained, sites):
+    cache.add(NEXT, 0, None)
+    slot = cache.incr(NEXT) % settings.MEMORY_PROFILE_ENTRIES
+    cache.set(f'{PREFIX}:{slot}', {
+        'time': time.time(),
+        'view': view,
+        'path': request.path,
+        'status': response.status_code,
+        'peak': peak,
+        'retained': retained,
+        'sites': sites,
+    }, None)
+
+
+def entries(view=None):
+    """Сохранённые профили, новые первыми."""
+    keys = [f'{PREFIX}:{slot}'
+            for slot in range(settings.MEMORY_PROFILE_ENTRIES)]
+    found = [entry for entry in cache.get_many(keys).values()
+             if view is None or entry['view'] == view]
+    return sorted(found, key=lambda entry: -entry['time'])
+
+
+def clear():
+    cache.delete_many(
+        [NEXT, *(f'{PREFIX}:{slot}'
+                 for slot in range(settings.MEMORY_PROFILE_ENTRIES))])
+
+
+def summary(view=None, limit=10):
+    """Пик, остаток и крупнейшие места выделения по каждому view."""
+    views = {}
+    for entry in entries(view):
+        row = views.setdefault(entry['view'], {
+            'view': entry['view'], 'samples': 0, 'peak_max': 0,
+            'peak_total': 0, 'retained_total': 0,
+            'sites': defaultdict(lambda: [0, 0]),
+        })
+        row['samples'] += 1
+        row['peak_max'] = max(row['peak_max'], entry['peak'])
+        row['peak_total'] += entry['peak']
+        row['retained_total'] += entry['retained']
+        for site, size, count in entry['sites']:
+            row['sites'][site][0] += size
+            row['sites'][site][1] += count
+    report = []
+    for row in sorted(views.values(), key=lambda row: -row['peak_max']):
+        samples = row['samples']
+        report.append({
+            'view': row['view'],
+            'samples': samples,
+            'peak_max': row['peak_max'],
+            'peak_mean': row['peak_total'] / samples,
+            'retained_mean': row['retained_total'] / samples,
+            'sites': [
+                [site, size / samples, count / samples] for site,
+                (size, count) in sorted(row['sites'].items(),
+                                        key=lambda item: -item[1][0])[:limit]
+            ],
+        })
+    return report
@@ -0,0 +1,261 @@
+"""Счётчики и гистограммы процесса, объединяемые по всем воркерам.
+
+Каждый процесс копит метрики в памяти и раз в METRICS_FLUSH_INTERVAL
+секунд атомарно записывает снимок в METRICS_DIR/<pid>-<id>.json: id
+отличает процесс от будущего процесса с тем же pid. collect()
+складывает снимки всех процессов, поэтому команда или любой воркер
+видят общие цифры без внешнего сервиса.
+
+Снимки завершившихся воркеров остаются в сумме, пока их не удалит
+reset() или пока они не пролежат METRICS_RETENTION секунд без
+обновлений; в этот момент общие счётчики уменьшаются, как при
+перезапуске.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм в секундах: от операций кэша до запросов.
+BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+class Registry:
+    """Метрики одного процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.counters = defaultdict(float)
+        # Гистограмма: счётчики корзин, последняя — больше BUCKETS[-1],
+        # затем сумма значений.
+        self.histograms = {}
+        self._flushed = time.monotonic()
+        self._pid = os.getpid()
+        self.name = f'{self._pid}-{uuid.uuid4().hex[:8]}.json'
+
+    def inc(self, name, amount=1, **labels):
+        self.update(counters=[(*_key(name, labels), amount)])
+
+    def observe(self, name, value, **labels):
+        self.update(observations=[(*_key(name, labels), value)])
+
+    def update(self, counters=(), observations=()):
+        """Несколько счётчиков и наблюдений под одной блокировкой.
+
+        Элементы — (имя, метки, значение), метки — кортеж пар,
+        отсортированный по имени метки.
+        """
+        with self._lock:
+            for name, labels, amount in counters:
+                self.counters[name, labels] += amount
+            for name, labels, value in observations:
+                histogram = self.histograms.get((name, labels))
+                if histogram is None:
+                    histogram = self.histograms[name, labels] = (
+                        [0] * (len(BUCKETS) + 2))
+                histogram[bisect.bisect_left(BUCKETS, value)] += 1
+                histogram[-1] += value
+        self._maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for
+                             (name, labels), value in self.counters.items()],
+                'histograms': [[name, dict(labels), list(values)] for
+                               (name, labels), values in
+                               self.histograms.items()],
+            }
+
+    def _maybe_flush(self):
+        if os.getpid() != self._pid:
+            # Потомок после fork не должен дописывать метрики родителя.
+            with self._lock:
+                self._reset()
+        now = time.monotonic()
+        with self._lock:
+            # Снимок пишет только поток, первым заметивший срок.
+            if now - self._flushed < settings.METRICS_FLUSH_INTERVAL:
+                return
+            self._flushed = now
+        self._write()
+
+    def flush(self):
+        """Записывает снимок процесса в METRICS_DIR."""
+        with self._lock:
+            self._flushed = time.monotonic()
+        self._write()
+
+    def _write(self):
+        # Ошибка записи не должна ломать запрос, который считает метрики.
+        directory = settings.METRICS_DIR
+        try:
+            os.makedirs(directory, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(
+                dir=directory, prefix='.', suffix='.tmp')
+            try:
+                with os.fdopen(descriptor, 'w') as file:
+                    json.dump(self.snapshot(), file)
+                os.replace(temporary, os.path.join(directory, self.name))
+            except BaseException:
+                os.unlink(temporary)
+                raise
+        except OSError:
+            logger.warning('Не удалось записать метрики в %s', directory,
+                           exc_info=True)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+
+registry = Registry()
+
+
+@atexit.register
+def _flush_on_exit():
+    if registry.counters or registry.histograms:
+        registry.flush()
+
+
+def _snapshots():
+    yield registry.snapshot()
+    directory = settings.METRICS_DIR
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    stale = time.time() - settings.METRICS_RETENTION
+    for name in names:
+        if not name.endswith('.json') or name == registry.name:
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < stale:
+                os.remove(path)
+                continue
+            with open(path) as file:
+                yield json.load(file)
+        except (OSError, ValueError):
+            continue
+
+
+def collect():
+    """Сумма метрик всех процессов: (counters, histograms) по ключам."""
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in _snapshots():
+        for name, labels, value in snapshot['counters']:
+            counters[_key(name, labels)] += value
+        for name, labels, values in snapshot['histograms']:
+            key = _key(name, labels)
+            merged = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(values):
+                merged[index] += value
+    return counters, histograms
+
+
+def reset():
+    """Сбрасывает метрики процесса и удаляет снимки воркеров.
+
+    Работающие воркеры при следующей записи вернут свои снимки,
+    поэтому полный сброс — вместе с перезапуском сервера.
+    """
+    registry.clear()
+    try:
+        names = os.listdir(settings.METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.endswith('.json'):
+            os.remove(os.path.join(settings.METRICS_DIR, name))
+
+
+def quantile(histogram, q):
+    """Верхняя граница корзины, в которую попадает квантиль q."""
+    count = sum(histogram[:-1])
+    if not count:
+        return None
+    rank = q * count
+    seen = 0
+    for index, amount in enumerate(histogram[:-1]):
+        seen += amount
+        if seen >= rank:
+            return BUCKETS[index] if index < len(BUCKETS) else float('inf')
+    return float('inf')
+
+
+def _labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _sample(value):
+    """Значение без потери точности: целые — без экспоненты."""
+    if float(value).is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(float(value))
+
+
+def prometheus_text(namespace='yatube', exclude=()):
+    """Метрики всех воркеров в текстовом формате Prometheus.
+
+    exclude — имена метрик, которые не стоит отдавать, например
+    с неограниченным числом меток.
+    """
+    counters, histograms = collect()
+    lines = []
+    families = {}
+    for (name, labels), value in counters.items():
+        if name in exclude:
+            continue
+        families.setdefault((name, 'counter'), []).append((labels, value))
+    for (name, labels), value in histograms.items():
+        families.setdefault((name, 'histogram'), []).append((labels, value))
+    for (name, kind), samples in sorted(families.items()):
+        metric = f'{namespace}_{name}'
+        if kind == 'counter':
+            metric += '_total'
+        lines.append(f'# TYPE {metric} {kind}')
+        for labels, value in sorted(samples):
+            if kind == 'counter':
+                lines.append(f'{metric}{_labels(labels)} {_sample(value)}')
+                continue
+            cumulative = 0
+            for bound, amount in zip((*BUCKETS, '+Inf'), value[:-1]):
+                cumulative += amount
+                lines.append(f'{metric}_bucket'
+                             f'{_labels(labels, [("le", bound)])} '
+                             f'{cumulative}')
+            lines.append(f'{metric}_sum{_labels(labels)} '
+                         f'{_sample(value[-1])}')
+            lines.append(f'{metric}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
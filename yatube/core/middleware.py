@@ -0,0 +1,145 @@
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_cache_control
+
+from . import instrumentation, memory
+from .metrics import registry
+from .routers import pin_primary, use_replicas
+
+STICKY_COOKIE = 'primary_reads'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class ReplicaStickinessMiddleware:
+    """Чтение своих записей: после записи пользователь читает default.
+
+    Запросы с небезопасными методами и запросы с подписанной cookie,
+    выданной после записи не раньше REPLICA_STICKY_SECONDS назад,
+    выполняются целиком на основной базе. Остальные запросы читают
+    реплики.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = request.method not in SAFE_METHODS
+        sticky = writes or request.get_signed_cookie(
+            STICKY_COOKIE, default=None,
+            max_age=settings.REPLICA_STICKY_SECONDS) is not None
+        with pin_primary() if sticky else use_replicas():
+            response = self.get_response(request)
+        wrote = writes or getattr(request, 'wrote_primary', False)
+        if wrote and response.status_code < 400:
+            response.set_signed_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+
+
+class ProxyCacheMiddleware:
+    """Cache-Control для страниц из PROXY_CACHED_VIEWS.
+
+    Анонимные ответы без cookie прокси хранит PROXY_CACHE_TIMEOUT секунд,
+    пока их не сбросит purge, а браузер каждый раз сверяет ETag.
+    Остальные ответы этих страниц прокси не кэширует. Заголовок,
+    выставленный самим view, не меняется.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        match = request.resolver_match
+        if (request.method not in ('GET', 'HEAD') or match is None
+                or match.view_name not in settings.PROXY_CACHED_VIEWS
+                or response.has_header('Cache-Control')):
+            return response
+        shared = (response.status_code in (200, 304)
+                  and not response.cookies
+                  and not request.user.is_authenticated)
+        if shared:
+            patch_cache_control(response, public=True, max_age=0,
+                                s_maxage=settings.PROXY_CACHE_TIMEOUT)
+        else:
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class RequestMetricsMiddleware:
+    """Задержка, SQL, рендер шаблонов и размер ответа по имени view.
+
+    Стоит первым, чтобы учитывать время остальных middleware. Запросы
+    без совпавшего маршрута попадают в view="<unresolved>". Все метрики
+    запроса пишутся в реестр одним обновлением под одной блокировкой,
+    после чего в лог попадают подозрения на N+1.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = instrumentation.start(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.stop()
+        elapsed = time.perf_counter() - started
+        instrumentation.report_repeated(stats)
+        view = (('view', instrumentation.view_name(request)),)
+        status = (('status', f'{response.status_code // 100}xx'),) + view
+        counters = [('http_requests', status, 1),
+                    ('db_queries', view, stats.queries)]
+        if not response.streaming:
+            # Корзины гистограмм рассчитаны на секунды, поэтому размер —
+            # счётчик: средний ответ — его отношение к числу запросов.
+            counters.append(
+                ('http_response_bytes', view, len(response.content)))
+        registry.update(counters=counters, observations=[
+            ('http_request_seconds', view, elapsed),
+            ('db_query_seconds', view, stats.query_seconds),
+            ('template_render_seconds', view, stats.template_seconds),
+        ])
+        return response
+
+
+class MemoryProfileMiddleware:
+    """Пик и оставшаяся память доли MEMORY_PROFILE_RATE запросов.
+
+    tracemalloc общий для процесса, поэтому одновременно профилируется
+    один запрос, а в многопоточном воркере в замер попадают и соседние
+    потоки. При нулевой доле middleware отключается при запуске.
+    """
+
+    def __init__(self, get_response):
+        if not settings.MEMORY_PROFILE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if (not memory.sampled() or tracemalloc.is_tracing()
+                or not self.lock.acquire(blocking=False)):
+            return self.get_response(request)
+        try:
+            tracemalloc.start(settings.MEMORY_PROFILE_FRAMES)
+            try:
+                response = self.get_response(request)
+                retained, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+            finally:
+                tracemalloc.stop()
+        finally:
+            self.lock.release()
+        memory.record(
+            instrumentation.view_name(request), request, response, peak,
+            retained, memory.allocation_sites(
+                snapshot, settings.MEMORY_PROFILE_TOP))
+        return response
@@ -0,0 +1,146 @@
+"""Профилировщик рендера шаблонов.
+
+Включается для доли запросов TEMPLATE_PROFILE_RATE. На время рендера
+такого запроса в потоке ставится sys.setprofile, который замечает
+только рендер шаблонов и узлов: остальные потоки и запросы ничего
+не платят. Собственное время каждого стека шаблон → узел → шаблон
+копится в метриках процесса и складывается по воркерам, поэтому
+его можно выгрузить в формате folded stacks для flame graph.
+
+Обработчик вызывается на каждую функцию Python, поэтому абсолютные
+значения завышены; доли частей страницы сохраняются.
+"""
+import random
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.template.base import Node, Template, TextNode, VariableNode
+
+from .metrics import collect, registry
+
+# Метрики профилировщика: собственное время и число вызовов стека.
+SECONDS = 'template_profile_seconds'
+CALLS = 'template_profile_calls'
+
+
+def sampled():
+    rate = settings.TEMPLATE_PROFILE_RATE
+    return rate >= 1 or rate > 0 and random.random() < rate
+
+
+def _label(node):
+    if isinstance(node, VariableNode):
+        return f'{{{{ {node.token.contents} }}}}'
+    return f'{{% {node.token.contents.split()[0]} %}}'
+
+
+class TemplateProfiler:
+    """Стек рендера одного потока: шаблоны и узлы с их временем."""
+
+    def __init__(self):
+        self.render_node = Node.render_annotated.__code__
+        # В тестах Django подменяет Template._render, поэтому код
+        # берётся в момент запуска.
+        self.render_template = Template._render.__code__
+        self.stack = []
+        self.frames = []
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def __call__(self, frame, event, arg):
+        code = frame.f_code
+        if code is self.render_node:
+            node = frame.f_locals['self']
+            if isinstance(node, TextNode):
+                return
+            label = _label(node)
+        elif code is self.render_template:
+            template = frame.f_locals['self']
+            label = template.origin.template_name or template.origin.name
+        else:
+            return
+        if event == 'call':
+            self.stack.append(label)
+            # [начало, время вложенных узлов]
+            self.frames.append([time.perf_counter(), 0.0])
+        elif event == 'return' and self.frames:
+            started, children = self.frames.pop()
+            total = time.perf_counter() - started
+            path = ';'.join(self.stack)
+            self.stack.pop()
+            self.seconds[path] += total - children
+            self.calls[path] += 1
+            if self.frames:
+                self.frames[-1][1] += total
+
+    def record(self, view):
+        registry.update(counters=[
+            *((SECONDS, (('stack', path), ('view', view)), seconds)
+              for path, seconds in self.seconds.items()),
+            *((CALLS, (('stack', path), ('view', view)), calls)
+              for path, calls in self.calls.items()),
+        ])
+
+
+def profile(render, view):
+    """Рендерит с профилировщиком, если поток не профилируется уже."""
+    if sys.getprofile() is not None:
+        return render()
+    profiler = TemplateProfiler()
+    sys.setprofile(profiler)
+    try:
+        return render()
+    finally:
+        sys.setprofile(None)
+        profiler.record(view)
+
+
+def profiles(view=None):
+    """Стеки всех воркеров: {(view, stack): (секунды, вызовы)}."""
+    counters, _ = collect()
+    result = {}
+    for (name, labels), value in counters.items():
+        if name not in (SECONDS, CALLS):
+            continue
+        labels = dict(labels)
+        if view is not None and labels['view'] != view:
+            continue
+        key = labels['view'], labels['stack']
+        seconds, calls = result.get(key, (0.0, 0))
+        if name == SECONDS:
+            seconds += value
+        else:
+            calls += int(value)
+        result[key] = seconds, calls
+    return result
+
+
+def folded(view=None, calls=False):
+    """Строки «view;шаблон;узел значение» для flamegraph.pl.
+
+    Значение — собственное время в микросекундах или число вызовов.
+    """
+    lines = []
+    for (name, stack), (seconds, count) in sorted(profiles(view).items()):
+        value = count if calls else round(seconds * 1e6)
+        if value:
+            lines.append(f'{name};{stack} {value}')
+    return lines
+
+
+def summary(view=None):
+    """Полное время и вызовы по шаблонам, include и тегам каждого view.
+
+    Рекурсивные вхождения одной части в стек считаются один раз.
+    """
+    totals = defaultdict(lambda: [0.0, 0])
+    for (name, stack), (seconds, count) in profiles(view).items():
+        frames = stack.split(';')
+        for label in set(frames):
+            totals[name, label][0] += seconds
+        totals[name, frames[-1]][1] += count
+    return sorted(((name, label, seconds, count) for
+                   (name, label), (seconds, count) in totals.items()),
+                  key=lambda row: (row[0], -row[2]))
@@ -0,0 +1,37 @@
+"""Суррогатные ключи для кэширующего обратного прокси.
+
+View собирает в request.surrogate_keys ключи объектов, из которых
+построена страница, и отдаёт их в заголовке SURROGATE_HEADER. Когда
+объект меняется, purge отправляет прокси его ключи, и прокси выбрасывает
+все страницы, помеченные ими.
+"""
+from functools import wraps
+
+SURROGATE_HEADER = 'Surrogate-Key'
+
+
+def tag(request, *keys):
+    """Помечает страницу ключами; вне surrogate_keys ничего не делает."""
+    collected = getattr(request, 'surrogate_keys', None)
+    if collected is not None:
+        collected.update(keys)
+
+
+def surrogate_keys(view):
+    """Выставляет SURROGATE_HEADER из ключей, собранных при рендере.
+
+    Ставится ближе всех к view, чтобы заголовок попал в кэш страницы
+    вместе с ответом.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.surrogate_keys = set()
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            keys = request.surrogate_keys
+            del request.surrogate_keys
+        if keys and not response.has_header(SURROGATE_HEADER):
+            response[SURROGATE_HEADER] = ' '.join(sorted(keys))
+        return response
+    return wrapper
@@ -0,0 +1,136 @@
+"""Отправка инвалидаций кэширующему прокси по суррогатным ключам."""
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.db import transaction
+
+from .proxy import SURROGATE_HEADER
+
+logger = logging.getLogger(__name__)
+
+
+def send(keys):
+    """POST на PURGE_URL с ключами в SURROGATE_HEADER, с повторами."""
+    request = urllib.request.Request(
+        settings.PURGE_URL, method='POST',
+        headers={SURROGATE_HEADER: ' '.join(keys),
+                 **settings.PURGE_HEADERS})
+    for attempt in range(settings.PURGE_RETRIES + 1):
+        try:
+            with urllib.request.urlopen(request,
+                                        timeout=settings.PURGE_TIMEOUT):
+                return True
+        except OSError as error:
+            if attempt == settings.PURGE_RETRIES:
+                logger.error('Не удалось сбросить в прокси %d ключей: %s',
+                             len(keys), error)
+                return False
+            time.sleep(2 ** attempt * 0.1)
+
+
+class PurgeDispatcher:
+    """Копит ключи и отправляет их пачками из фонового потока.
+
+    Поток просыпается после первого ключа и ждёт PURGE_INTERVAL секунд,
+    чтобы собрать в одну пачку инвалидации соседних записей.
+    """
+
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def put(self, keys):
+        with self._lock:
+            self._pending.update(keys)
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='purge',
+                                 daemon=True).start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            time.sleep(settings.PURGE_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Отправляет накопленные ключи пачками по PURGE_BATCH_SIZE."""
+        with self._lock:
+            keys = sorted(self._pending)
+            self._pending.clear()
+        size = settings.PURGE_BATCH_SIZE
+        for start in range(0, len(keys), size):
+            send(keys[start:start + size])
+
+
+dispatcher = PurgeDispatcher()
+
+
+def purge(*keys):
+    """Сбрасывает страницы с ключами в прокси после коммита транзакции."""
+    if settings.PURGE_URL and keys:
+        transaction.on_commit(lambda: dispatcher.put(keys))
+
+
+class StubPurgeServer:
+    """Заглушка прокси: принимает инвалидации и запоминает пачки ключей.
+
+    Нужна для тестов и локальной разработки, см. команду purge_stub.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, on_purge=None):
+        batches = self.batches = []
+        received = self.received = threading.Condition()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                keys = self.headers.get(SURROGATE_HEADER, '').split()
+                with received:
+                    batches.append(keys)
+                    received.notify_all()
+                if on_purge is not None:
+                    on_purge(keys)
+                body = json.dumps({'status': 'ok'}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/purge'
+
+    def wait(self, count, timeout=5):
+        """Ждёт, пока придёт count пачек, и возвращает все пачки."""
+        with self.received:
+            self.received.wait_for(lambda: len(self.batches) >= count,
+                                   timeout)
+            return list(self.batches)
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,84 @@
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+PRIMARY = 'default'
+# Сессии читаются сразу после входа, отставшая реплика их ещё не видит.
+PRIMARY_APPS = {'sessions'}
+
+_state = threading.local()
+
+
+@contextmanager
+def pin_primary():
+    """Внутри блока все чтения текущего потока идут в основную базу."""
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+
+
+@contextmanager
+def use_replicas():
+    """Внутри блока чтения текущего потока могут идти в реплики.
+
+    Блок открывает ReplicaStickinessMiddleware для запросов, которые
+    не пишут. Команды, миграции и фоновые потоки читают основную базу:
+    они часто пишут по прочитанному и не должны видеть отставание.
+    """
+    _state.replicas = getattr(_state, 'replicas', 0) + 1
+    try:
+        yield
+    finally:
+        _state.replicas -= 1
+
+
+def is_pinned():
+    return getattr(_state, 'depth', 0) > 0
+
+
+def reads_replica():
+    """Идут ли чтения текущего потока в реплики."""
+    return (bool(settings.DATABASE_REPLICAS)
+            and getattr(_state, 'replicas', 0) > 0 and not is_pinned())
+
+
+def pins_primary(view):
+    """Для представлений, которые пишут в базу на GET-запрос.
+
+    Запрос читает основную базу, а ReplicaStickinessMiddleware
+    закрепляет за пользователем основную базу и на следующие запросы.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.wrote_primary = True
+        with pin_primary():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Читает из случайной реплики DATABASE_REPLICAS, пишет в default.
+
+    В реплики идут только чтения внутри use_replicas().
+    """
+
+    def db_for_read(self, model, **hints):
+        if (not reads_replica()
+                or model._meta.app_label in PRIMARY_APPS):
+            return PRIMARY
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,70 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connections
+
+# Через сколько инструкций виртуальной машины SQLite проверять дедлайн.
+PROGRESS_STEPS = 1000
+
+
+def apply_pragmas(cursor, pragmas):
+    """Выполняет PRAGMA из словаря имя — значение на курсоре SQLite."""
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created: настраивает новое соединение SQLite.
+
+    Берёт PRAGMAS из настроек базы или общий SQLITE_PRAGMAS.
+    journal_mode сохраняется в самом файле базы, остальные
+    настройки действуют только на время соединения.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS',
+                                           settings.SQLITE_PRAGMAS)
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas)
+
+
+class DeadlineExceeded(OperationalError):
+    """Запрос не уложился в отведённое время."""
+
+
+@contextmanager
+def deadline(seconds):
+    """Прерывает запросы к SQLite, не успевшие до истечения seconds.
+
+    Долгий запрос останавливает progress handler, а ожидание
+    блокировки ограничивает busy_timeout. Для других СУБД ничего
+    не делает.
+    """
+    expires = time.monotonic() + seconds
+
+    def wrapper(execute, sql, params, many, context):
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded('Время на запросы истекло')
+        database = context['connection'].connection
+        busy_timeout = database.execute('PRAGMA busy_timeout').fetchone()[0]
+        database.execute(f'PRAGMA busy_timeout = {int(remaining * 1000)}')
+        database.set_progress_handler(
+            lambda: time.monotonic() > expires, PROGRESS_STEPS)
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as error:
+            if time.monotonic() > expires:
+                raise DeadlineExceeded(str(error)) from error
+            raise
+        finally:
+            database.set_progress_handler(None, 0)
+            database.execute(f'PRAGMA busy_timeout = {busy_timeout}')
+
+    with ExitStack() as stack:
+        for alias in connections:
+            if connections[alias].vendor == 'sqlite':
+                stack.enter_context(
+                    connections[alias].execute_wrapper(wrapper))
+        yield
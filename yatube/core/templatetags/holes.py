@@ -0,0 +1,20 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..holes import render_hole
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **kwargs):
+    """Персональная вставка: шаблон с аргументами и контекстом запроса.
+
+    На страницах с общим кэшем оставляет метку для второго прохода,
+    на остальных отрисовывается сразу.
+    """
+    request = context.get('request')
+    holes = getattr(request, 'holes', None)
+    if holes is None:
+        return mark_safe(render_hole(template_name, kwargs, request))
+    return holes.punch(template_name, kwargs)
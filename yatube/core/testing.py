@@ -0,0 +1,40 @@
+"""Тестовое окружение, которое не трогает кэш работающих серверов."""
+import copy
+import os
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from .metrics import registry
+
+
+@contextmanager
+def isolated_storage():
+    """Кэш по умолчанию и метрики во временном каталоге на время тестов."""
+    with tempfile.TemporaryDirectory() as directory:
+        caches = copy.deepcopy(settings.CACHES)
+        caches['default']['LOCATION'] = os.path.join(directory,
+                                                     'cache.sqlite3')
+        with override_settings(
+                CACHES=caches,
+                METRICS_DIR=os.path.join(directory, 'metrics')):
+            try:
+                yield directory
+            finally:
+                # Иначе atexit допишет тестовые метрики в настоящий
+                # METRICS_DIR.
+                registry.clear()
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._storage = ExitStack()
+        self._storage.enter_context(isolated_storage())
+
+    def teardown_test_environment(self, **kwargs):
+        self._storage.close()
+        super().teardown_test_environment(**kwargs)
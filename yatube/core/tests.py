@@ -1,4 +1,42 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import pickle
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+from posts.models import Comment, Post
+
+from .cache.admission import FrequencySketch
+from .cache.instrumented import InstrumentedCache, cache_report
+from .cache.layered import LocalLRU, TwoTierCache
+from .cache.sqlite import SQLiteCache
+from .instrumentation import params_shape
+from .memory import entries, summary as memory_summary
+from .metrics import collect, prometheus_text, registry, reset
+from .middleware import (STICKY_COOKIE, ReplicaStickinessMiddleware,
+                         RequestMetricsMiddleware)
+from .profiling import folded, summary
+from .purge import PurgeDispatcher, StubPurgeServer, send
+from .routers import ReplicaRouter, pin_primary, use_replicas
+from .sqlite import DeadlineExceeded, deadline
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +44,643 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def read_alias(self, request):
+        """Пропускает запрос через middleware и возвращает базу чтения."""
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = ReplicaStickinessMiddleware(view)(request)
+        return seen[0], response
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_reads_go_to_replica(self):
+        """Чтение идёт в реплику, запись и сессии — в основную базу."""
+        with use_replicas():
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            self.assertEqual(self.router.db_for_read(Session), 'default')
+            with pin_primary():
+                self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_reads_outside_requests_go_to_primary(self):
+        """Команды и фоновые потоки читают основную базу."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        with use_replicas(), ThreadPoolExecutor(1) as pool:
+            self.assertEqual(
+                pool.submit(self.router.db_for_read, Post).result(),
+                'default')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_reads_stick_to_primary_after_write(self):
+        """После записи чтения пользователя закреплены за основной базой."""
+        alias, response = self.read_alias(self.factory.post('/create/'))
+        self.assertEqual(alias, 'default')
+        cookie = response.cookies[STICKY_COOKIE]
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = cookie.value
+        self.assertEqual(self.read_alias(request)[0], 'default')
+        self.assertEqual(self.read_alias(self.factory.get('/'))[0],
+                         'replica')
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_expired_cookie_reads_replica(self):
+        """Просроченная или поддельная cookie не закрепляет чтения."""
+        _, response = self.read_alias(self.factory.post('/create/'))
+        for value in (response.cookies[STICKY_COOKIE].value, 'forged'):
+            request = self.factory.get('/')
+            request.COOKIES[STICKY_COOKIE] = value
+            with override_settings(REPLICA_STICKY_SECONDS=-1):
+                self.assertEqual(self.read_alias(request)[0], 'replica')
+
+    def test_follow_on_get_sets_sticky_cookie(self):
+        """Подписка по GET-запросу тоже закрепляет основную базу."""
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        self.client.force_login(user)
+        response = self.client.get(
+            reverse('posts:profile_follow', args=[author.username]))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+
+class DeadlineTests(TestCase):
+    def test_long_query_is_interrupted(self):
+        """Запрос, не успевший к дедлайну, прерывается."""
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceeded):
+            with deadline(0.05), connection.cursor() as cursor:
+                cursor.execute(
+                    'WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL '
+                    'SELECT n + 1 FROM numbers WHERE n < 100000000) '
+                    'SELECT count(*) FROM numbers')
+        self.assertLess(time.monotonic() - started, 1)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0],
+                             settings.SQLITE_PRAGMAS['busy_timeout'])
+
+
+class SQLiteTuningTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_gets_pragmas(self):
+        """Новое соединение получает настройки из SQLITE_PRAGMAS."""
+        self.assertEqual(self.pragma('busy_timeout'),
+                         settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(self.pragma('cache_size'),
+                         settings.SQLITE_PRAGMAS['cache_size'])
+        self.assertEqual(self.pragma('synchronous'), 1)
+
+    def test_maintenance_command(self):
+        """Обслуживание выполняет ANALYZE и сообщает о завершении."""
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        self.assertIn('ANALYZE выполнен', out.getvalue())
+        self.assertIn('Обслуживание завершено', out.getvalue())
+
+
+class SQLiteMaintenanceTests(TransactionTestCase):
+    def test_vacuum_all_pages(self):
+        """--vacuum-pages 0 возвращает все свободные страницы."""
+        out = StringIO()
+        for _ in range(2):
+            call_command('sqlite_maintenance', '--enable-incremental',
+                         '--vacuum-pages', '0', stdout=out)
+        self.assertIn('Свободных страниц', out.getvalue())
+        self.assertEqual(out.getvalue().count('Обслуживание завершено'), 2)
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.location,
+                                 {'OPTIONS': {'MAX_ENTRIES': 50}})
+
+    def test_basic_operations(self):
+        """Кэш хранит значения, соблюдает сроки и работает пачками."""
+        self.cache.set('post', {'text': 'Пост'})
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(self.cache.get('post'), {'text': 'Пост'})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': [2]})
+        self.assertFalse(self.cache.add('a', 5))
+        self.cache.set('short', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 2))
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_shared_between_processes(self):
+        """Процессы видят записи друг друга, incr атомарен."""
+        self.cache.set('counter', 0, timeout=None)
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_increment,
+                                   args=(self.location, 100))
+                   for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 400)
+
+    def test_has_room(self):
+        """has_room() сообщает о заполнении до вытеснения."""
+        self.assertTrue(self.cache.has_room())
+        self.cache.set_many({f'key-{n}': n for n in range(45)})
+        self.assertFalse(self.cache.has_room())
+        self.cache.clear()
+        self.assertTrue(self.cache.has_room())
+
+    def test_cull_keeps_size_limited(self):
+        """При переполнении вытесняются записи, истекающие раньше."""
+        for number in range(120):
+            self.cache.set(f'key-{number}', number, timeout=1000 + number)
+        self.assertLessEqual(
+            len(self.cache.get_many(f'key-{n}' for n in range(120))), 100)
+        self.assertEqual(self.cache.get('key-119'), 119)
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.shared = LocMemCache('two-tier-tests', {})
+        self.addCleanup(self.shared.clear)
+        self.cache = TwoTierCache(self.shared, local_size=2,
+                                  local_timeout=60, lock_timeout=5, wait=2)
+        self.builds = 0
+
+    def build(self, value='страница', delay=0):
+        self.builds += 1
+        time.sleep(delay)
+        return value
+
+    def test_single_flight(self):
+        """Одновременные промахи пересобирают запись один раз."""
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.cache.get_or_build('page', lambda: self.build(delay=0.2),
+                                    60)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(results, ['страница'] * 8)
+
+    def test_previous_value_while_rebuilding(self):
+        """Пока запись пересобирается, остальные получают прежнюю."""
+        self.cache.get_or_build('page:1', self.build, 60, stale_key='page')
+        self.shared.add('lock:page:2', 'other', 5)
+        value = self.cache.get_or_build(
+            'page:2', lambda: self.build('новая'), 60, stale_key='page')
+        self.assertEqual(value, 'страница')
+        self.assertEqual(self.builds, 1)
+
+    def test_uncacheable_values_are_not_stored(self):
+        """Значения, отвергнутые cacheable, не сохраняются."""
+        for _ in range(2):
+            self.cache.get_or_build('page', self.build, 60,
+                                    cacheable=lambda value: False)
+        self.assertEqual(self.builds, 2)
+        self.assertIsNone(self.shared.get('lock:page'))
+
+    def test_soft_timeout_refreshes_in_background(self):
+        """После мягкого срока запись отдаётся, а обновляется в фоне."""
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.cache.soft_timeout = 0
+        self.cache.executor = executor
+        self.cache.get_or_build('page', self.build, 60)
+        value = self.cache.get_or_build(
+            'page', lambda: self.build('новая', delay=0.1), 60)
+        self.assertEqual(value, 'страница')
+        executor.shutdown(wait=True)
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(self.cache.get('page'), 'новая')
+
+    def test_degraded_on_database_error(self):
+        """Если база упала, отдаётся предыдущая версия с пометкой."""
+        self.cache.budget = 1
+        self.cache.get_or_build('page:1', self.build, 60, stale_key='page')
+
+        def broken():
+            raise OperationalError('database is locked')
+
+        value = self.cache.get_or_build(
+            'page:2', broken, 60, stale_key='page',
+            degraded=lambda value, reason: (value, reason))
+        self.assertEqual(value, ('страница', 'error'))
+        self.assertIsNone(self.shared.get('lock:page:2'))
+        with self.assertRaises(OperationalError):
+            self.cache.get_or_build('other', broken, 60, stale_key='other')
+
+    def test_admission_when_shared_cache_is_full(self):
+        """В заполненный общий кэш попадают только повторные запросы."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared = SQLiteCache(os.path.join(directory.name, 'cache.sqlite3'),
+                             {'OPTIONS': {'MAX_ENTRIES': 10}})
+        shared.set_many({f'hot-{n}': n for n in range(10)})
+        cache = TwoTierCache(shared, local_size=2, local_timeout=60,
+                             lock_timeout=5, wait=2)
+        cache.get_or_build('page:1', self.build, 60, stale_key='page')
+        self.assertIsNone(shared.get('page:1'))
+        cache.local.clear()
+        cache.get_or_build('page:1', self.build, 60, stale_key='page')
+        self.assertIsNotNone(shared.get('page:1'))
+
+    def test_local_tier(self):
+        """Локальный уровень отдаёт копии и вытесняет старые записи."""
+        self.cache.set('page', ['пост'], 60)
+        self.shared.delete('page')
+        first = self.cache.get('page')
+        first.append('изменён')
+        self.assertEqual(self.cache.get('page'), ['пост'])
+        lru = LocalLRU(size=2, timeout=60)
+        for key in ('a', 'b', 'c'):
+            lru.set(key, key)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.get('c'), 'c')
+
+    def test_frequency_admission(self):
+        """Разовый ключ не вытесняет популярные записи из LRU."""
+        sketch = FrequencySketch(width=64)
+        lru = LocalLRU(size=2, timeout=60, sketch=sketch)
+        for key in ('a', 'b', 'a', 'b'):
+            sketch.increment(key)
+            lru.set(key, key)
+        sketch.increment('once')
+        self.assertFalse(lru.set('once', 'once'))
+        self.assertEqual((lru.get('a'), lru.get('b')), ('a', 'b'))
+        for _ in range(3):
+            sketch.increment('hot')
+        self.assertTrue(lru.set('hot', 'hot'))
+        self.assertIsNone(lru.get('a'))
+
+    def test_sketch_ages(self):
+        """Счётчики насыщаются и со временем делятся пополам."""
+        sketch = FrequencySketch(width=8, limit=15)
+        for _ in range(20):
+            sketch.increment('key')
+        self.assertEqual(sketch.estimate('key'), 15)
+        for _ in range(sketch.sample):
+            sketch.increment('other')
+        self.assertLess(sketch.estimate('key'), 15)
+
+
+class PurgeDispatcherTests(SimpleTestCase):
+    def test_batches_reach_proxy(self):
+        """Ключи уходят в прокси пачками не больше PURGE_BATCH_SIZE."""
+        with StubPurgeServer() as stub, self.settings(
+                PURGE_URL=stub.url, PURGE_BATCH_SIZE=2, PURGE_INTERVAL=0):
+            dispatcher = PurgeDispatcher()
+            dispatcher.put(['post-1', 'index'])
+            dispatcher.put(['post-1', 'author-2'])
+            batches = stub.wait(2)
+        self.assertEqual(sorted(key for batch in batches for key in batch),
+                         ['author-2', 'index', 'post-1'])
+        self.assertTrue(all(len(batch) <= 2 for batch in batches))
+
+    def test_unreachable_proxy(self):
+        """Недоступный прокси не роняет отправку."""
+        with StubPurgeServer() as stub:
+            url = stub.url
+        with self.settings(PURGE_URL=url, PURGE_RETRIES=1):
+            with self.assertLogs('core.purge', 'ERROR'):
+                self.assertFalse(send(['index']))
+
+
+class IsolatedMetricsMixin:
+    """Пустые метрики во временном каталоге и пустой кэш на каждый тест."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = self.settings(
+            METRICS_DIR=os.path.join(self.directory, 'metrics'),
+            METRICS_TOKEN='secret')
+        override.enable()
+        self.addCleanup(override.disable)
+        reset()
+        cache.clear()
+
+
+class CacheMetricsTests(IsolatedMetricsMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = InstrumentedCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': {'BACKEND': 'core.cache.sqlite.SQLiteCache',
+                         'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}})
+
+    def rows(self):
+        return {(row['tier'], row['prefix']): row
+                for row in cache_report()['caches']}
+
+    def test_counts_by_prefix(self):
+        """Обращения считаются по префиксам ключей."""
+        self.cache.set('index_page:1', b'page')
+        self.cache.get('index_page:1')
+        self.cache.get('index_page:2')
+        self.cache.get_many(['article:1', 'article:2'])
+        self.cache.add('generation:1', 5)
+        rows = self.rows()
+        page = rows['shared', 'index_page']
+        self.assertEqual((page['hits'], page['misses'], page['sets']),
+                         (1, 1, 1))
+        self.assertEqual(page['bytes_written'], len(
+            pickle.dumps(b'page', pickle.HIGHEST_PROTOCOL)))
+        self.assertEqual(rows['shared', 'article']['misses'], 2)
+        self.assertEqual(rows['shared', 'generation']['sets'], 1)
+        self.assertEqual(rows['shared', 'generation']['bytes_written'], 8)
+        operations = {(row['operation'], row['prefix'])
+                      for row in cache_report()['latency']}
+        self.assertIn(('get', 'index_page'), operations)
+
+    def test_batches_counted_by_prefix(self):
+        """Пакетные операции учитываются по префиксу каждого ключа."""
+        self.cache.set_many({'index_page:1': b'page', 'article:1': 1,
+                             'article:2': 2})
+        self.cache.get_many(['index_page:1', 'index_page:2', 'article:1'])
+        rows = self.rows()
+        page = rows['shared', 'index_page']
+        article = rows['shared', 'article']
+        self.assertEqual((page['hits'], page['misses'], page['sets']),
+                         (1, 1, 1))
+        self.assertEqual((article['hits'], article['misses'],
+                          article['sets'], article['bytes_written']),
+                         (1, 0, 2, 16))
+        operations = {(row['operation'], row['prefix'])
+                      for row in cache_report()['latency']}
+        self.assertIn(('get_many', 'mixed'), operations)
+
+    def test_evictions_and_other_workers(self):
+        """Вытеснения и снимки других воркеров попадают в сводку."""
+        for number in range(120):
+            self.cache.set(f'article:{number}', number)
+        self.assertGreater(self.rows()['shared', 'article']['evictions'], 0)
+        registry.flush()
+        os.rename(os.path.join(settings.METRICS_DIR, registry.name),
+                  os.path.join(settings.METRICS_DIR, 'worker.json'))
+        registry.clear()
+        registry.inc('cache_hits', 3, tier='local', prefix='index_page')
+        rows = self.rows()
+        self.assertEqual(rows['local', 'index_page']['hits'], 3)
+        self.assertEqual(rows['shared', 'article']['sets'], 120)
+
+    def test_unwritable_directory(self):
+        """Ошибка записи снимка не ломает обращения к кэшу."""
+        with tempfile.NamedTemporaryFile() as file, self.settings(
+                METRICS_DIR=os.path.join(file.name, 'metrics'),
+                METRICS_FLUSH_INTERVAL=0):
+            with self.assertLogs('core.metrics', 'WARNING'):
+                self.cache.set('index_page:1', b'page')
+            self.assertEqual(self.cache.get('index_page:1'), b'page')
+
+    def test_stale_snapshots_pruned(self):
+        """Давно не обновлявшиеся снимки удаляются из сводки."""
+        registry.inc('cache_hits', 3, tier='local', prefix='index_page')
+        registry.flush()
+        path = os.path.join(settings.METRICS_DIR, 'worker.json')
+        os.rename(os.path.join(settings.METRICS_DIR, registry.name), path)
+        registry.clear()
+        self.assertEqual(self.rows()['local', 'index_page']['hits'], 3)
+        old = time.time() - settings.METRICS_RETENTION - 1
+        os.utime(path, (old, old))
+        self.assertNotIn(('local', 'index_page'), self.rows())
+        self.assertFalse(os.path.exists(path))
+
+    def test_endpoint_access(self):
+        """Метрики доступны по токену и сотрудникам."""
+        url = reverse('core:cache_stats')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertIn('caches', response.json())
+        self.client.force_login(
+            User.objects.create_user(username='admin', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        out = StringIO()
+        call_command('cache_stats', stdout=out)
+        self.assertIn('префикс', out.getvalue())
+
+
+class RequestMetricsTests(IsolatedMetricsMixin, TestCase):
+    def test_view_metrics(self):
+        """Запрос учитывается под именем view вместе с SQL и шаблонами."""
+        Post.objects.create(
+            text='Текст', author=User.objects.create_user(username='auth'))
+        self.client.get(reverse('posts:index'))
+        self.client.get('/no/such/page/')
+        counters, histograms = collect()
+        view = (('view', 'posts:index'),)
+        self.assertEqual(
+            counters['http_requests', (('status', '2xx'),) + view], 1)
+        self.assertEqual(counters['http_requests', (
+            ('status', '4xx'), ('view', '<unresolved>'))], 1)
+        self.assertGreater(counters['db_queries', view], 0)
+        self.assertGreater(counters['http_response_bytes', view], 0)
+        self.assertGreater(histograms['template_render_seconds', view][-1],
+                           0)
+        self.assertEqual(
+            sum(histograms['http_request_seconds', view][:-1]), 1)
+
+    def test_prometheus_endpoint(self):
+        """/metrics отдаёт текстовый формат Prometheus только по токену."""
+        url = reverse('core:metrics')
+        self.assertEqual(url, '/metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        text = response.content.decode()
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('# TYPE yatube_http_requests_total counter', text)
+        self.assertIn('yatube_http_requests_total{status="2xx",'
+                      'view="posts:index"} 1', text)
+        self.assertIn('yatube_http_request_seconds_bucket{'
+                      'view="posts:index",le="+Inf"} 1', text)
+        self.assertIn('yatube_http_request_seconds_count{'
+                      'view="posts:index"} 1', text)
+
+    def test_large_values_exported_exactly(self):
+        """Большие счётчики и суммы выгружаются без округления."""
+        registry.inc('http_response_bytes', 123456789, view='posts:index')
+        registry.observe('http_request_seconds', 1234567.125,
+                         view='posts:index')
+        text = prometheus_text()
+        self.assertIn('yatube_http_response_bytes_total{'
+                      'view="posts:index"} 123456789\n', text)
+        self.assertIn('yatube_http_request_seconds_sum{'
+                      'view="posts:index"} 1234567.125\n', text)
+
+    def test_single_registry_update(self):
+        """Метрики запроса пишутся одним обновлением реестра,
+        а у потокового ответа размер не считается."""
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        middleware = RequestMetricsMiddleware(
+            lambda request: StreamingHttpResponse(iter([b'x'])))
+        with mock.patch.object(registry, 'update') as update:
+            middleware(request)
+        update.assert_called_once()
+        names = [name for name, _, _ in update.call_args[1]['counters']]
+        self.assertEqual(names, ['http_requests', 'db_queries'])
+
+
+class QueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(6):
+            Post.objects.create(text='Текст', author=User.objects.create_user(
+                username=f'author{number}'))
+
+    def setUp(self):
+        cache.clear()
+        self.template = engines['django'].from_string(
+            '{% for post in posts %}\n'
+            '{{ post.author.username }}\n'
+            '{% endfor %}')
+
+    def render(self, request):
+        return HttpResponse(self.template.render(
+            {'posts': Post.objects.order_by('pk')}))
+
+    def test_repeated_queries(self):
+        """Одинаковый SQL в цикле шаблона отмечается как N+1."""
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        middleware = RequestMetricsMiddleware(self.render)
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            middleware(request)
+        self.assertEqual(len(logs.output), 1)
+        message = logs.output[0]
+        self.assertIn('N+1: 6 одинаковых запросов', message)
+        self.assertIn('<unresolved>', message)
+        self.assertIn('→ post.author.username', message)
+        self.assertIn(':2', message)
+        self.assertIn('core/tests.py', message)
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_slow_query(self):
+        """Медленный запрос пишется в лог с view и местом вызова."""
+        with self.assertLogs('core.instrumentation', 'WARNING') as logs:
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('view posts:index' in message
+                            for message in logs.output))
+        self.assertTrue(any('вызван из posts/' in message
+                            for message in logs.output))
+
+    def test_params_shape(self):
+        """В лог попадают типы параметров, а не значения."""
+        self.assertEqual(params_shape([1, 'secret']), '(int, str)')
+        self.assertEqual(params_shape(list(range(10))), '(int × 10)')
+        self.assertEqual(params_shape([(1,), (2,)], many=True),
+                         '2 × (int)')
+        self.assertEqual(params_shape(None), '()')
+
+
+class TemplateProfileTests(IsolatedMetricsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(text=f'Текст {number}', author=author)
+            for number in range(10))
+
+    def test_disabled_by_default(self):
+        """Без TEMPLATE_PROFILE_RATE стеки не собираются."""
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(folded(), [])
+
+    @override_settings(TEMPLATE_PROFILE_RATE=1)
+    def test_folded_stacks(self):
+        """Стеки шаблонов, include и тегов собираются по view."""
+        self.client.get(reverse('posts:index'))
+        stacks = [line.rsplit(' ', 1)[0] for line in folded('posts:index')]
+        self.assertIn('posts:index;posts/index.html', stacks)
+        self.assertTrue(any(stack.endswith(
+            '{% include %};posts/includes/paginator.html') for
+            stack in stacks))
+        self.assertTrue(any(stack.endswith('{% url %}') for stack in stacks))
+        rows = {label: (seconds, calls) for view, label, seconds, calls in
+                summary('posts:index')}
+        self.assertEqual(rows['posts/index.html'][1], 1)
+        self.assertGreaterEqual(rows['posts/includes/article.html'][1], 10)
+        out = StringIO()
+        call_command('template_profile', '--folded', '--calls',
+                     stdout=out)
+        self.assertIn('posts:index;posts/index.html 1\n', out.getvalue())
+        response = self.client.get(reverse('core:metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertIn('yatube_http_requests_total', response.content.decode())
+        self.assertNotIn('template_profile', response.content.decode())
+
+
+@override_settings(MEMORY_PROFILE_RATE=1, MEMORY_PROFILE_ENTRIES=2)
+class MemoryProfileTests(IsolatedMetricsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(text='Текст', author=author)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author, text=f'Комментарий {n}')
+            for n in range(20))
+
+    def test_profiles_by_view(self):
+        """Пик и места выделения памяти сохраняются по view."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        [entry] = entries()
+        self.assertEqual(entry['view'], 'posts:post_detail')
+        self.assertEqual(entry['path'], url)
+        self.assertGreater(entry['peak'], 0)
+        self.assertGreaterEqual(entry['peak'], entry['retained'])
+        self.assertTrue(entry['sites'])
+        [row] = memory_summary()
+        self.assertEqual(row['samples'], 1)
+        out = StringIO()
+        call_command('memory_profile', stdout=out)
+        self.assertIn('posts:post_detail: профилей 1', out.getvalue())
+
+    def test_ring_buffer(self):
+        """Хранятся только последние MEMORY_PROFILE_ENTRIES профилей."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:post_detail', args=(self.post.pk,)))
+        self.client.get(reverse('posts:profile', args=('auth',)))
+        self.assertEqual([entry['view'] for entry in entries()],
+                         ['posts:profile', 'posts:post_detail'])
+        call_command('memory_profile', '--clear', stdout=StringIO())
+        self.assertEqual(entries(), [])
+
+    @override_settings(MEMORY_PROFILE_RATE=0)
+    def test_disabled(self):
+        """При нулевой доле запросы не профилируются."""
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(entries(), [])
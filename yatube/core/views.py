@@ -1,4 +1,13 @@
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from .cache.instrumented import cache_report
+from .metrics import prometheus_text
+from .profiling import CALLS, SECONDS
 
 
 def page_not_found(request, exception):
@@ -17,3 +26,29 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics_access(view):
+    """Пускает к метрикам сотрудников и запросы с METRICS_TOKEN."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = settings.METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        allowed = request.user.is_staff or bool(token) and (
+            constant_time_compare(header, f'Bearer {token}'))
+        if not allowed:
+            return HttpResponseForbidden()
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@metrics_access
+def cache_stats(request):
+    return JsonResponse(cache_report())
+
+
+@metrics_access
+def metrics(request):
+    # Стеки профилировщика шаблонов выгружает команда template_profile.
+    return HttpResponse(prometheus_text(exclude=(SECONDS, CALLS)),
+                        content_type='text/plain; version=0.0.4')
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Group, Comment
+from .search import get_backend
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -13,6 +14,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return get_backend().filter(queryset, search_term), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('pk',
@@ -0,0 +1,218 @@
+import hashlib
+import time
+from functools import wraps
+
+from core.cache.layered import TwoTierCache
+from core.holes import fill, render_shared
+from core.routers import reads_replica
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import QueryDict
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+
+from .utilities import decode_cursor, encode_cursor
+
+listings = TwoTierCache(
+    cache,
+    local_size=settings.LISTING_LOCAL_ENTRIES,
+    local_timeout=settings.LISTING_LOCAL_TIMEOUT,
+    lock_timeout=settings.LISTING_BUILD_LOCK_TIMEOUT,
+    wait=settings.LISTING_BUILD_WAIT,
+    soft_timeout=settings.LISTING_SOFT_TIMEOUT,
+    budget=settings.LISTING_BUILD_BUDGET,
+)
+DEGRADED_HEADER = 'X-Cache-Degraded'
+
+
+def _generation_key(scope):
+    # Слаги и имена пользователей могут содержать пробелы и кириллицу.
+    return 'generation:' + hashlib.md5(scope.encode()).hexdigest()
+
+
+def _bumped_key(scope):
+    return 'bumped:' + hashlib.md5(scope.encode()).hexdigest()
+
+
+def _initial_generation():
+    # Начинаем со времени, а не с единицы: после вытеснения ключа
+    # из кэша поколение не повторит значение, которое уже было.
+    return int(time.time() * 1000)
+
+
+def get_generations(scopes):
+    """Возвращает текущие поколения областей кэша одним get_many."""
+    keys = {_generation_key(scope): scope for scope in scopes}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _initial_generation(), None)
+        found[key] = cache.get(key)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def bump(*scopes):
+    """Сдвигает поколения после коммита транзакции.
+
+    Закэшированные страницы областей устаревают. До коммита другой
+    запрос собрал бы страницу по старым данным и сохранил бы её
+    под новым поколением.
+    """
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    for scope in set(scopes):
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), None)
+    if settings.DATABASE_REPLICAS:
+        cache.set_many({_bumped_key(scope): True for scope in scopes},
+                       settings.REPLICA_STICKY_SECONDS)
+
+
+def replica_may_lag(scopes):
+    """Могла ли страница областей собраться по отставшей реплике.
+
+    Так бывает, если чтения шли в реплику, а поколение областей
+    сдвинулось меньше REPLICA_STICKY_SECONDS назад: реплика могла ещё
+    не получить запись, а страница легла бы под новое поколение.
+    """
+    return reads_replica() and bool(
+        cache.get_many([_bumped_key(scope) for scope in scopes]))
+
+
+def _degraded(response, reason):
+    response[DEGRADED_HEADER] = reason
+    response['Warning'] = '111 - "Revalidation Failed"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def canonical_query(query, last_page=None):
+    """Параметры пагинации в каноническом виде, остальные отбрасываются.
+
+    Испорченный курсор и номер, который не число или не больше
+    единицы, означают первую страницу, как и в CursorPaginator.
+    Номер дальше last_page заменяется последней страницей.
+    """
+    cursor = query.get('cursor')
+    decoded = decode_cursor(cursor) if cursor else None
+    if decoded is not None:
+        return {'cursor': encode_cursor(*decoded)}
+    try:
+        number = int(query.get('page'))
+    except (TypeError, ValueError):
+        return {}
+    if last_page is not None:
+        number = min(number, last_page)
+    return {'page': number} if number > 1 else {}
+
+
+def cache_listing(key_prefix, *scopes):
+    """Кэширует страницу под ключом с поколениями областей.
+
+    Области задаются шаблонами вида 'group:{slug}' и заполняются
+    аргументами view. После записи поста поколение меняется, и страница
+    строится заново, поэтому срок жизни кэша может быть долгим.
+    Страница общая для всех пользователей: персональные части выносятся
+    в теги hole и отрисовываются после кэша для каждого запроса.
+    Страницу пересобирает один запрос, остальные получают её предыдущую
+    версию из listings. Её же получают, если база не ответила вовремя,
+    с заголовком DEGRADED_HEADER. Страница, собранная по реплике вскоре
+    после записи, отдаётся, но не сохраняется, см. replica_may_lag.
+
+    Ключ строится по canonical_query, и view получает тот же
+    нормализованный request.GET: лишние параметры и разные записи
+    одного номера страницы не плодят копии в кэше.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            names = [scope.format(**kwargs) for scope in scopes]
+            generations = get_generations(names)
+            version = '.'.join(str(generations[name]) for name in names)
+            path = hashlib.md5(request.path.encode()).hexdigest()
+            last_page_key = f'last_page:{key_prefix}:{path}:{version}'
+            query = canonical_query(request.GET)
+            if 'page' in query:
+                query = canonical_query(request.GET,
+                                        cache.get(last_page_key))
+            request.GET = QueryDict(urlencode(query))
+            url = hashlib.md5(
+                f'{request.path}?{request.GET.urlencode()}'.encode()
+            ).hexdigest()
+            page = f'{key_prefix}:{url}'
+            cache_key = f'{page}:{version}'
+
+            def build():
+                response = render_shared(view, request, *args, **kwargs)
+                last_page = getattr(request, 'last_page', None)
+                if last_page is not None:
+                    cache.set(last_page_key, last_page,
+                              settings.LISTING_CACHE_TIMEOUT)
+                return response
+
+            response = listings.get_or_build(
+                cache_key,
+                build,
+                settings.LISTING_CACHE_TIMEOUT,
+                stale_key=f'stale:{page}',
+                cacheable=lambda response: (
+                    response.status_code == 200
+                    and not replica_may_lag(names)),
+                degraded=_degraded,
+            )
+            return fill(response, request)
+        return wrapper
+    return decorator
+
+
+def conditional(*scopes, lookup=None):
+    """Отвечает 304 Not Modified, если поколения областей не менялись.
+
+    ETag собирается из поколений, пользователя и адреса до вызова view.
+    lookup(**kwargs) дополняет аргументы view значениями для шаблонов
+    областей; если он вернул None, страница отдаётся без проверки.
+    """
+    def etag(request, *args, **kwargs):
+        if lookup is not None:
+            found = lookup(**kwargs)
+            if found is None:
+                return None
+            kwargs = {**kwargs, **found}
+        names = [scope.format(**kwargs) for scope in scopes]
+        generations = get_generations(names)
+        parts = (request.user.pk or 0, request.get_full_path(),
+                 *(generations[name] for name in names))
+        return hashlib.md5(repr(parts).encode()).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header(DEGRADED_HEADER):
+                # Устаревшую страницу нельзя подтверждать свежим ETag.
+                del response['ETag']
+            return response
+        return wrapper
+    return decorator
+
+
+def article_key(post, is_index):
+    """Ключ фрагмента поста: всё, от чего зависит его разметка."""
+    parts = (
+        post.pk,
+        post.updated.timestamp(),
+        post.author.get_full_name(),
+        post.group.slug if post.group_id else '',
+        is_index,
+    )
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'article:{post.pk}:{digest}'
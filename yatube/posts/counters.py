@@ -0,0 +1,84 @@
+from core.routers import pin_primary
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Follow, Post, User
+from .utilities import bulk_create_in_batches
+
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _actual(model, field):
+    amount = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(amount=Count('pk'))
+        .values('amount')
+    )
+    return Coalesce(Subquery(amount, output_field=IntegerField()), 0)
+
+
+def with_actual_counts(users):
+    """Добавляет к пользователям реальные значения счётчиков."""
+    return users.annotate(**{
+        f'actual_{name}': _actual(*source)
+        for name, source in COUNTERS.items()
+    })
+
+
+def recount(user_id):
+    """Пересчитывает счётчики пользователя по таблицам постов и подписок.
+
+    Подсчёт идёт по основной базе: в реплике может не быть последних
+    записей, и в счётчики попали бы старые значения.
+    """
+    with pin_primary():
+        user = with_actual_counts(User.objects.filter(pk=user_id)).get()
+        stats, _ = AuthorStats.objects.update_or_create(
+            user_id=user_id,
+            defaults={name: getattr(user, f'actual_{name}')
+                      for name in COUNTERS},
+        )
+    return stats
+
+
+def recount_all(batch_size=1000):
+    """Заново заполняет счётчики всех пользователей одним проходом."""
+    users = with_actual_counts(User.objects.order_by())
+    AuthorStats.objects.all().delete()
+    bulk_create_in_batches(
+        AuthorStats,
+        (AuthorStats(user_id=user.pk,
+                     **{name: getattr(user, f'actual_{name}')
+                        for name in COUNTERS})
+         for user in users.iterator()),
+        batch_size,
+    )
+
+
+def change(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя на заданные величины.
+
+    Если строки со счётчиками ещё нет, при увеличении она создаётся
+    пересчётом, а уменьшение пропускается: пользователь может быть
+    удалён вместе со своими счётчиками.
+    """
+    updated = AuthorStats.objects.filter(user_id=user_id).update(**{
+        name: Greatest(F(name) + delta, 0)
+        for name, delta in deltas.items()
+    })
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        recount(user_id)
+
+
+def get_stats(user):
+    """Счётчики пользователя; используйте select_related('stats')."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return recount(user.pk)
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import AuthorStats, FeedEntry, Follow, Post
+from .utilities import bulk_create_in_batches
+
+FEED_BATCH_SIZE = 500
+FEED_KEYS = ('feed_date', 'feed_post')
+
+
+def _create_entries(entries):
+    bulk_create_in_batches(FeedEntry, entries, FEED_BATCH_SIZE,
+                           ignore_conflicts=True)
+
+
+def _followers(author_id):
+    return AuthorStats.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+
+
+def _insert_entries(follows):
+    """Раскладывает посты авторов подписок одним INSERT ... SELECT."""
+    rows = follows.filter(author__posts__isnull=False).values_list(
+        'user_id', 'author_id', 'author__posts__id',
+        'author__posts__pub_date',
+    ).order_by()
+    sql, params = rows.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FeedEntry._meta.db_table} '
+            f'(user_id, author_id, post_id, pub_date) {sql}', params)
+
+
+def is_celebrity(author_id):
+    return _followers(author_id) > settings.FEED_FANOUT_LIMIT
+
+
+def fan_out_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Посты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    не раскладываются, а подмешиваются в ленту при чтении.
+    """
+    if is_celebrity(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _create_entries(
+        FeedEntry(user_id=user_id,
+                  post_id=post.id,
+                  author_id=post.author_id,
+                  pub_date=post.pub_date)
+        for user_id in follower_ids.iterator()
+    )
+
+
+def add_author_to_feed(user_id, author_id):
+    """Добавляет в ленту пользователя посты нового автора подписки."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date')
+    _create_entries(
+        FeedEntry(user_id=user_id,
+                  post_id=post_id,
+                  author_id=author_id,
+                  pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def remove_author_from_feed(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild_feeds():
+    """Заново раскладывает посты по лентам всех подписчиков.
+
+    Нужна после массовой загрузки через bulk_create, которая
+    не отправляет сигналы. Счётчики подписчиков должны быть актуальны.
+    Записи вставляются одним INSERT ... SELECT, без создания объектов.
+    """
+    FeedEntry.objects.all().delete()
+    _insert_entries(Follow.objects.exclude(
+        author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT))
+
+
+def restore_author_feeds(author_id):
+    """Раскладывает посты автора, который перестал быть популярным.
+
+    Пока подписчиков больше FEED_FANOUT_LIMIT, посты автора подмешиваются
+    при чтении, а у подписавшихся в это время записей в ленте нет.
+    Когда после отписки подписчиков становится ровно FEED_FANOUT_LIMIT,
+    посты автора заново раскладываются по лентам всех подписчиков.
+    """
+    if _followers(author_id) != settings.FEED_FANOUT_LIMIT:
+        return
+    FeedEntry.objects.filter(author_id=author_id).delete()
+    _insert_entries(Follow.objects.filter(author_id=author_id))
+
+
+def celebrity_ids(user_id):
+    """Авторы из подписок пользователя, посты которых не раскладываются."""
+    return set(
+        Follow.objects.filter(
+            user_id=user_id,
+            author__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values_list('author_id', flat=True)
+    )
+
+
+def follow_feed(user):
+    """Лента подписок: записи пользователя плюс посты популярных авторов.
+
+    Посты упорядочены по ключу FEED_KEYS: без популярных авторов это
+    колонки самой ленты, и выборка идёт по индексу feed_user_date_idx.
+    """
+    posts = Post.objects.select_related('author', 'group')
+    celebrities = celebrity_ids(user.id)
+    if not celebrities:
+        return posts.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date'),
+            feed_post=F('feed_entries__post'),
+        ).order_by('-feed_date', '-feed_post')
+    entries = FeedEntry.objects.filter(user=user).values('post_id')
+    return posts.filter(
+        Q(id__in=entries) | Q(author_id__in=celebrities)
+    ).annotate(
+        feed_date=F('pub_date'),
+        feed_post=F('id'),
+    ).order_by('-feed_date', '-feed_post')
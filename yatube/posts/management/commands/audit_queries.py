@@ -0,0 +1,97 @@
+import random
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from posts.query_plans import (explain, is_covered, problems,
+                               propose_index, sort_table)
+from posts.workload import WORKLOAD, Sample
+
+
+class Command(BaseCommand):
+    help = ('Выполняет запросы страниц posts, проверяет их планы '
+            'через EXPLAIN QUERY PLAN и предлагает индексы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз выполнить каждый запрос для замера времени.')
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Показывать планы и тех запросов, где проблем нет.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Аудит поддерживает только SQLite.')
+        self.repeat = max(options['repeat'], 1)
+        rng = random.Random(options['seed'])
+        sample = Sample(20, rng)
+        client = Client(REMOTE_ADDR='10.0.0.1')
+        if sample.readers:
+            client.force_login(rng.choice(sample.readers))
+        proposals = {}
+        total = flagged = 0
+        for route, _, _ in WORKLOAD:
+            method, url, data = sample.request(route, rng)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                getattr(client, method)(url, data)
+            selects = [query['sql'] for query in queries.captured_queries
+                       if query['sql'].startswith('SELECT')]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{route}: {url} {data or ""}'))
+            spent = 0
+            for sql in selects:
+                elapsed = self.benchmark(sql)
+                spent += elapsed
+                plan = explain(sql)
+                scans, sorts = problems(plan)
+                if not (scans or sorts or options['verbose_plans']):
+                    continue
+                flagged += bool(scans or sorts)
+                style = self.style.WARNING if scans or sorts else str
+                self.stdout.write(style(f'  {elapsed:8.2f} мс  {sql[:150]}'))
+                for line in plan:
+                    self.stdout.write(f'      {line}')
+                tables = set(scans)
+                if sorts and sort_table(sql):
+                    tables.add(sort_table(sql))
+                for table in tables:
+                    columns = propose_index(sql, table)
+                    if columns and not is_covered(table, columns):
+                        proposals.setdefault((table, columns), set()).add(
+                            route)
+            total += spent
+            self.stdout.write(
+                f'  запросов: {len(selects)}, время SQL: {spent:.2f} мс')
+        self.report(proposals, total, flagged)
+
+    def benchmark(self, sql):
+        """Медиана времени запроса в миллисекундах."""
+        timings = []
+        with connection.cursor() as cursor:
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                cursor.execute(sql)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
+
+    def report(self, proposals, total, flagged):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'Всего времени SQL: {total:.2f} мс, '
+            f'проблемных запросов: {flagged}'))
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS('Новых индексов не нужно'))
+            return
+        self.stdout.write('Предлагаемые индексы:')
+        for (table, columns), routes in sorted(proposals.items()):
+            self.stdout.write(
+                f'  {table} ({", ".join(columns)})  '
+                f'— {", ".join(sorted(routes))}')
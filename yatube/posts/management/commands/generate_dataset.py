@@ -0,0 +1,224 @@
+import random
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from posts import counters, feed
+from posts.models import Comment, Follow, Group, Post, User
+from posts.search import get_backend
+from posts.thumbnails import generate_thumbnails
+from posts.utilities import bulk_create_in_batches
+
+
+@contextmanager
+def explicit_dates(*models):
+    """Позволяет задать pub_date вручную, отключая auto_now_add."""
+    fields = [model._meta.get_field('pub_date') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class PowerLaw:
+    """Выбор элементов с вероятностью, убывающей как 1 / rank ** exponent.
+
+    Порядок элементов перемешивается, чтобы популярность
+    не совпадала с порядком создания.
+    """
+
+    def __init__(self, items, exponent, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ))
+        self.rng = rng
+
+    def choice(self):
+        point = self.rng.random() * self.weights[-1]
+        return self.items[bisect_left(self.weights, point)]
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками для нагрузочных тестов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок у пользователя.')
+        parser.add_argument(
+            '--images', type=float, default=0.1,
+            help='Доля постов с картинкой.')
+        parser.add_argument(
+            '--image-variants', type=int, default=10,
+            help='Сколько разных картинок создать для постов.')
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона для авторов и подписок.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней разбросать даты.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--password', default='loadtest',
+            help='Пароль всех созданных пользователей.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.rng = random.Random(options['seed'])
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(options['seed'])
+        self.now = timezone.now()
+        with explicit_dates(Post, Comment):
+            user_ids = self.stage('Пользователи', self.create_users)
+            group_ids = self.stage('Группы', self.create_groups)
+            images = self.stage('Картинки', self.create_images)
+            post_ids = self.stage('Посты', self.create_posts,
+                                  user_ids, group_ids, images)
+            self.stage('Комментарии', self.create_comments,
+                       user_ids, post_ids)
+            self.stage('Подписки', self.create_follows, user_ids)
+        self.stage('Счётчики', counters.recount_all, self.batch_size)
+        self.stage('Ленты', feed.rebuild_feeds)
+        self.stage('Поиск', get_backend().rebuild)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
+
+    def stage(self, title, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        amount = f': {len(result)}' if isinstance(result, list) else ''
+        self.stdout.write(
+            f'{title}{amount} за {time.perf_counter() - started:.1f} с')
+        return result
+
+    def random_date(self):
+        seconds = self.rng.randrange(self.options['days'] * 24 * 60 * 60)
+        return self.now - timedelta(seconds=seconds)
+
+    def new_ids(self, model, objects):
+        # bulk_create в SQLite не возвращает id, поэтому новые строки
+        # находятся по id больше прежнего максимума.
+        last_id = model.objects.aggregate(last=Max('id'))['last'] or 0
+        bulk_create_in_batches(model, objects, self.batch_size)
+        return list(model.objects.filter(id__gt=last_id).order_by(
+            'id').values_list('id', flat=True))
+
+    def create_users(self):
+        password = make_password(self.options['password'])
+        offset = User.objects.aggregate(last=Max('id'))['last'] or 0
+        return self.new_ids(User, (
+            User(username=f'{self.faker.user_name()}{offset + number}',
+                 first_name=self.faker.first_name(),
+                 last_name=self.faker.last_name(),
+                 email=self.faker.email(),
+                 password=password)
+            for number in range(self.options['users'])
+        ))
+
+    def create_groups(self):
+        offset = Group.objects.aggregate(last=Max('id'))['last'] or 0
+        return self.new_ids(Group, (
+            Group(title=self.faker.sentence(nb_words=3)[:200],
+                  slug=f'group-{offset + number}',
+                  description=self.faker.paragraph()[:300])
+            for number in range(self.options['groups'])
+        ))
+
+    def create_images(self):
+        if not self.options['images']:
+            return []
+        names = []
+        for number in range(self.options['image_variants']):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            content = BytesIO()
+            Image.new('RGB', (1200, 600), color).save(content, 'JPEG')
+            name = default_storage.save(f'posts/dataset-{number}.jpg',
+                                        ContentFile(content.getvalue()))
+            try:
+                generate_thumbnails(name)
+            except Exception as error:
+                self.stderr.write(f'{name}: {error}')
+            names.append(name)
+        return names
+
+    def create_posts(self, user_ids, group_ids, images):
+        authors = PowerLaw(user_ids, self.options['exponent'], self.rng)
+        share = self.options['images']
+
+        def posts():
+            for _ in range(self.options['posts']):
+                with_image = images and self.rng.random() < share
+                yield Post(
+                    author_id=authors.choice(),
+                    group_id=(self.rng.choice(group_ids)
+                              if group_ids and self.rng.random() < 0.7
+                              else None),
+                    text=self.faker.text(max_nb_chars=400),
+                    image=self.rng.choice(images) if with_image else '',
+                    pub_date=self.random_date(),
+                )
+
+        return self.new_ids(Post, posts())
+
+    def create_comments(self, user_ids, post_ids):
+        if not post_ids:
+            return []
+        posts = PowerLaw(post_ids, self.options['exponent'], self.rng)
+        return self.new_ids(Comment, (
+            Comment(post_id=posts.choice(),
+                    author_id=self.rng.choice(user_ids),
+                    text=self.faker.sentence(nb_words=12),
+                    pub_date=self.random_date())
+            for _ in range(self.options['comments'])
+        ))
+
+    def create_follows(self, user_ids):
+        authors = PowerLaw(user_ids, self.options['exponent'], self.rng)
+        average = self.options['follows']
+        limit = len(user_ids) - 1
+
+        def follows():
+            for user_id in user_ids:
+                amount = min(int(self.rng.expovariate(1 / average)), limit)
+                chosen = set()
+                # Популярных авторов выбирают часто, поэтому число
+                # попыток ограничено, а подписок может выйти меньше.
+                for _ in range(amount * 3):
+                    if len(chosen) == amount:
+                        break
+                    author_id = authors.choice()
+                    if author_id != user_id:
+                        chosen.add(author_id)
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        if not average:
+            return []
+        return self.new_ids(Follow, follows())
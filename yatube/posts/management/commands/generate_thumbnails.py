@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры для картинок существующих постов.'
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').values_list('image',
+                                                            flat=True)
+        done = failed = 0
+        for name in images.iterator():
+            try:
+                generate_thumbnails(name)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+            else:
+                done += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}, ошибок: {failed}'))
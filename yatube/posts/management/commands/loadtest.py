@@ -0,0 +1,120 @@
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from posts.workload import WORKLOAD, WRITES, Sample
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    return values[max(math.ceil(rank / 100 * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет смешанную нагрузку через WSGI-приложение '
+            'и выводит перцентили задержки по маршрутам.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--sample', type=int, default=200,
+            help='Сколько групп, авторов и постов выбрать для запросов.')
+        parser.add_argument(
+            '--writes', action='store_true',
+            help='Добавить в смесь запросы на запись.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if settings.DEBUG:
+            self.stderr.write('DEBUG включён: задержки будут завышены.')
+        rng = random.Random(options['seed'])
+        sample = Sample(options['sample'], rng)
+        workload = [
+            item for item in WORKLOAD + (WRITES if options['writes'] else ())
+            if item[0] != 'group_posts' or sample.slugs
+            if not item[2] or sample.readers
+        ]
+        routes = [route for route, _, _ in workload]
+        weights = [weight for _, weight, _ in workload]
+        needs_login = {route: login for route, _, login in workload}
+        concurrency = max(options['concurrency'], 1)
+        clients = [self.clients(sample, rng) for _ in range(concurrency)]
+
+        timings = defaultdict(list)
+        errors = defaultdict(int)
+        lock = threading.Lock()
+
+        def worker(number, amount):
+            rng = random.Random(
+                None if options['seed'] is None
+                else options['seed'] + number)
+            guest, member = clients[number]
+            try:
+                for _ in range(amount):
+                    route = rng.choices(routes, weights)[0]
+                    client = member if needs_login[route] else guest
+                    method, url, data = sample.request(route, rng)
+                    started = time.perf_counter()
+                    try:
+                        response = getattr(client, method)(url, data)
+                        failed = response.status_code >= 500
+                    except Exception:
+                        failed = True
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        timings[route].append(elapsed)
+                        errors[route] += failed
+            finally:
+                connection.close()
+
+        share, extra = divmod(options['requests'], concurrency)
+        threads = [
+            threading.Thread(target=worker,
+                             args=(number, share + (number < extra)))
+            for number in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        self.report(timings, errors, elapsed)
+
+    @staticmethod
+    def clients(sample, rng):
+        """Анонимный и авторизованный клиенты одного потока."""
+        # Адрес не из INTERNAL_IPS, чтобы не включалась debug_toolbar.
+        guest = Client(REMOTE_ADDR='10.0.0.1')
+        member = Client(REMOTE_ADDR='10.0.0.1')
+        if sample.readers:
+            member.force_login(rng.choice(sample.readers))
+        return guest, member
+
+    def report(self, timings, errors, elapsed):
+        header = ''.join(f'{f"p{rank}":>9}' for rank in PERCENTILES)
+        self.stdout.write(
+            f'{"route":<16}{"count":>7}{"errors":>8}{header}{"max":>9}')
+        total = 0
+        for route in sorted(timings):
+            values = sorted(timings[route])
+            total += len(values)
+            columns = ''.join(
+                f'{percentile(values, rank) * 1000:>9.1f}'
+                for rank in PERCENTILES)
+            self.stdout.write(
+                f'{route:<16}{len(values):>7}{errors[route]:>8}'
+                f'{columns}{values[-1] * 1000:>9.1f}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Запросов: {total} за {elapsed:.1f} с, '
+            f'{total / elapsed:.1f} в секунду; задержки в мс'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import COUNTERS, with_actual_counts
+from posts.models import AuthorStats, User
+
+
+class Command(BaseCommand):
+    help = 'Находит и исправляет расхождения счётчиков постов и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя.',
+        )
+
+    def handle(self, *args, **options):
+        users = with_actual_counts(User.objects.select_related('stats'))
+        drift = {}
+        for user in users.iterator():
+            stats = getattr(user, 'stats', None)
+            actual = {name: getattr(user, f'actual_{name}')
+                      for name in COUNTERS}
+            stored = {name: getattr(stats, name, 0) for name in COUNTERS}
+            if stats is not None and actual == stored:
+                continue
+            if stats is None and not any(actual.values()):
+                continue
+            drift[user.pk] = actual
+            for name in COUNTERS:
+                if actual[name] != stored[name]:
+                    self.stdout.write(
+                        f'{user.username}: {name} '
+                        f'{stored[name]} -> {actual[name]}')
+        if not options['dry_run']:
+            with transaction.atomic():
+                for user_id, actual in drift.items():
+                    AuthorStats.objects.update_or_create(user_id=user_id,
+                                                         defaults=actual)
+        verb = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} расхождений: {len(drift)}'))
@@ -0,0 +1,53 @@
+# Generated by Django 2.2.16 on 2026-10-17 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+
+    def counts(queryset, field):
+        return dict(queryset.values(field).annotate(
+            amount=Count('pk')).values_list(field, 'amount'))
+
+    posts = counts(Post.objects.order_by(), 'author')
+    followers = counts(Follow.objects.order_by(), 'author')
+    following = counts(Follow.objects.order_by(), 'user')
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=user_id,
+                     posts_count=posts.get(user_id, 0),
+                     followers_count=followers.get(user_id, 0),
+                     following_count=following.get(user_id, 0))
+         for user_id in {*posts, *followers, *following}),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0014_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -22,11 +22,19 @@ class Post(CreatedModel):
     image = models.ImageField('Картинка',
                               upload_to='posts/',
                               blank=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -56,6 +64,12 @@ class Comment(CreatedModel):
     text = models.TextField('текст комментария',
                             help_text='Оставьте комментарий')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'pub_date'],
+                         name='comment_post_date_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User,
@@ -70,3 +84,46 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_subscription')
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(User,
+                             related_name='feed_entries',
+                             on_delete=models.CASCADE)
+    post = models.ForeignKey(Post,
+                             related_name='feed_entries',
+                             on_delete=models.CASCADE)
+    author = models.ForeignKey(User,
+                               related_name='+',
+                               on_delete=models.CASCADE)
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='feed_user_date_idx'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(User,
+                                primary_key=True,
+                                related_name='stats',
+                                on_delete=models.CASCADE)
+    posts_count = models.PositiveIntegerField('постов', default=0)
+    followers_count = models.PositiveIntegerField('подписчиков', default=0)
+    following_count = models.PositiveIntegerField('подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
@@ -0,0 +1,76 @@
+"""Разбор планов запросов SQLite и подбор индексов для них."""
+import re
+
+from django.db import connection
+
+SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?(?: USING (?:COVERING )?INDEX)?')
+TEMP_SORT = 'USE TEMP B-TREE'
+ORDER_BY = re.compile(r'\bORDER BY (.+?)(?:\bLIMIT\b|$)', re.S)
+
+
+def explain(sql):
+    """Строки EXPLAIN QUERY PLAN для запроса с подставленными параметрами."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def problems(plan):
+    """Возвращает таблицы, прочитанные целиком, и сортировки на лету.
+
+    Проход по индексу без сортировки не считается проблемой: при LIMIT
+    он останавливается на первых строках.
+    """
+    sorts = [line for line in plan if TEMP_SORT in line]
+    scans = []
+    for line in plan:
+        match = SCAN.match(line)
+        if not match or 'VIRTUAL TABLE' in line:
+            continue
+        if 'USING' not in match.group(0) or sorts:
+            scans.append(match.group(1))
+    return scans, sorts
+
+
+def sort_table(sql):
+    """Таблица первой колонки сортировки: индекс по ней уберёт сортировку."""
+    order = ORDER_BY.search(sql)
+    match = order and re.match(r'\s*"(\w+)"\.', order.group(1))
+    return match.group(1) if match else None
+
+
+def _columns(table, fragment, pattern):
+    return list(dict.fromkeys(re.findall(
+        rf'"{table}"\."(\w+)"{pattern}', fragment)))
+
+
+def propose_index(sql, table):
+    """Подбирает колонки составного индекса для таблицы из запроса.
+
+    Сначала идут колонки из условий на равенство, затем колонки
+    сортировки. Первичный ключ в конце отбрасывается: SQLite и так
+    хранит rowid в каждом индексе.
+    """
+    where = sql.split(' WHERE ', 1)[1] if ' WHERE ' in sql else ''
+    order = ORDER_BY.search(sql)
+    where = ORDER_BY.sub('', where)
+    columns = _columns(table, where, r' (?:= |IN \()')
+    if order:
+        columns += [column for column in _columns(table, order.group(1), '')
+                    if column not in columns]
+    while columns and columns[-1] == 'id':
+        columns.pop()
+    return tuple(columns)
+
+
+def existing_indexes(table):
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [tuple(info['columns']) for info in constraints.values()
+            if info['index'] or info['unique'] or info['primary_key']]
+
+
+def is_covered(table, columns):
+    """Есть ли индекс, который начинается с этих колонок."""
+    return any(index[:len(columns)] == columns
+               for index in existing_indexes(table))
@@ -0,0 +1,161 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+TOKEN = re.compile(r'\w+')
+
+
+class BaseSearchBackend:
+    """Индекс полнотекстового поиска по текстам постов."""
+
+    def index(self, post):
+        raise NotImplementedError
+
+    def remove(self, post_id):
+        raise NotImplementedError
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def search(self, query, offset, limit):
+        """Возвращает id постов, упорядоченные по релевантности."""
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """Оставляет в queryset только найденные посты."""
+        raise NotImplementedError
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Поиск по виртуальной таблице FTS5 с rowid, равным id поста."""
+    table = 'posts_post_fts'
+
+    @staticmethod
+    def match_expression(query):
+        # Каждое слово — отдельная фраза с поиском по префиксу,
+        # поэтому синтаксис FTS5 во вводе пользователя не работает.
+        return ' '.join(
+            '"{}"*'.format(token) for token in TOKEN.findall(query.lower())
+        )
+
+    @staticmethod
+    def _reading():
+        return connections[router.db_for_read(Post)]
+
+    @staticmethod
+    def _writing():
+        return connections[router.db_for_write(Post)]
+
+    def index(self, post):
+        with self._writing().cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s',
+                           [post.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text])
+
+    def remove(self, post_id):
+        with self._writing().cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s',
+                           [post_id])
+
+    def rebuild(self):
+        with self._writing().cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}')
+
+    def count(self, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return 0
+        with self._reading().cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s', [expression])
+            return cursor.fetchone()[0]
+
+    def search(self, query, offset, limit):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        with self._reading().cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} '
+                f'WHERE {self.table} MATCH %s '
+                f'ORDER BY rank LIMIT %s OFFSET %s',
+                [expression, limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset.none()
+        return queryset.extra(
+            where=[f'{Post._meta.db_table}.id IN (SELECT rowid '
+                   f'FROM {self.table} WHERE {self.table} MATCH %s)'],
+            params=[expression],
+        )
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Запасной поиск через LIKE для баз без FTS5."""
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def filter(self, queryset, query):
+        tokens = TOKEN.findall(query)
+        if not tokens:
+            return queryset.none()
+        for token in tokens:
+            queryset = queryset.filter(text__icontains=token)
+        return queryset
+
+    def count(self, query):
+        return self.filter(Post.objects.all(), query).count()
+
+    def search(self, query, offset, limit):
+        posts = self.filter(Post.objects.all(), query)
+        return list(posts.values_list('id', flat=True)[
+            offset:offset + limit])
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+class SearchResults:
+    """Ленивый список найденных постов для search_paginator."""
+
+    def __init__(self, query, backend=None):
+        self.query = query
+        self.backend = backend or get_backend()
+
+    def count(self):
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        start, stop = item.start or 0, item.stop
+        ids = self.backend.search(self.query, start, stop - start)
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
@@ -0,0 +1,117 @@
+from core.purge import purge
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, feed
+from .models import Comment, Follow, Group, Post, User
+from .search import get_backend
+
+
+def post_scopes(post):
+    scopes = ['index', f'post:{post.pk}', f'profile:{post.author.username}']
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+def post_keys(post):
+    """Суррогатные ключи страниц прокси, на которых виден пост."""
+    keys = ['index', f'post-{post.pk}', f'author-{post.author_id}']
+    if post.group_id:
+        keys.append(f'group-{post.group.slug}')
+    return keys
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    if instance.pk:
+        old_slug = Post.objects.filter(pk=instance.pk).values_list(
+            'group__slug', flat=True).first()
+        if old_slug:
+            caching.bump(f'group:{old_slug}')
+            purge(f'group-{old_slug}')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change(instance.author_id, posts_count=1)
+        feed.fan_out_post(instance)
+    get_backend().index(instance)
+    caching.bump(*post_scopes(instance))
+    purge(*post_keys(instance))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, posts_count=-1)
+    get_backend().remove(instance.pk)
+    caching.bump(*post_scopes(instance))
+    purge(*post_keys(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    caching.bump(f'post:{instance.post_id}')
+    purge(f'comments-{instance.post_id}')
+
+
+@receiver(pre_save, sender=Group)
+def group_changing(sender, instance, **kwargs):
+    if instance.pk:
+        old_slug = Group.objects.filter(pk=instance.pk).values_list(
+            'slug', flat=True).first()
+        if old_slug:
+            caching.bump(f'group:{old_slug}')
+            purge(f'group-{old_slug}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.bump('index', f'group:{instance.slug}')
+    purge('index', f'group-{instance.slug}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change(instance.author_id, followers_count=1)
+        counters.change(instance.user_id, following_count=1)
+        feed.add_author_to_feed(instance.user_id, instance.author_id)
+        caching.bump(f'profile:{instance.author.username}',
+                     f'profile:{instance.user.username}')
+        purge(f'author-{instance.author_id}', f'author-{instance.user_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change(instance.author_id, followers_count=-1)
+    counters.change(instance.user_id, following_count=-1)
+    feed.remove_author_from_feed(instance.user_id, instance.author_id)
+    feed.restore_author_feeds(instance.author_id)
+    caching.bump(f'profile:{instance.author.username}',
+                 f'profile:{instance.user.username}')
+    purge(f'author-{instance.author_id}', f'author-{instance.user_id}')
+
+
+def profile_changed(update_fields):
+    # Вход пользователя обновляет только last_login: страницы не меняются.
+    return update_fields is None or set(update_fields) != {'last_login'}
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    if instance.pk and profile_changed(update_fields):
+        old_username = User.objects.filter(pk=instance.pk).values_list(
+            'username', flat=True).first()
+        if old_username and old_username != instance.username:
+            caching.bump(f'profile:{old_username}')
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if not created and profile_changed(update_fields):
+        caching.bump(f'profile:{instance.username}')
+        purge(f'author-{instance.pk}')
@@ -0,0 +1,30 @@
+from core.proxy import tag
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..caching import article_key
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def article_fragments(context, posts):
+    """Возвращает разметку постов из кэша, отрисовывая только промахи."""
+    request = context['request']
+    tag(request, *(f'post-{post.pk}' for post in posts))
+    is_index = request.resolver_match.view_name == 'posts:index'
+    keys = [article_key(post, is_index) for post in posts]
+    fragments = cache.get_many(keys)
+    missing = {
+        key: render_to_string('posts/includes/article.html',
+                              {'post': post, 'is_index': is_index})
+        for key, post in zip(keys, posts)
+        if key not in fragments
+    }
+    if missing:
+        cache.set_many(missing, settings.FRAGMENT_CACHE_TIMEOUT)
+        fragments.update(missing)
+    return [mark_safe(fragments[key]) for key in keys]
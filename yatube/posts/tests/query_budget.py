@@ -0,0 +1,88 @@
+"""Замер числа SQL-запросов и времени отрисовки страниц posts."""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def seed(authors=3, groups=2, posts=30, comments=25, followers=5):
+    """Создаёт данные, на которых каждая страница заполнена целиком.
+
+    Посты и подписки создаются через ORM, чтобы сработали сигналы
+    ленты, счётчиков и поиска. Последний автор и его пост получают
+    по два поста и комментария: на них видно, растёт ли число запросов
+    вместе с размером страницы.
+    """
+    data = {
+        'groups': [
+            Group.objects.create(title=f'Группа {number}',
+                                 slug=f'group-{number}',
+                                 description='Описание')
+            for number in range(groups)
+        ],
+        'authors': [
+            User.objects.create_user(username=f'author-{number}',
+                                     first_name='Автор',
+                                     last_name=str(number))
+            for number in range(authors)
+        ],
+        'readers': [
+            User.objects.create_user(username=f'reader-{number}')
+            for number in range(followers)
+        ],
+    }
+    for index, author in enumerate(data['authors']):
+        amount = 2 if index == authors - 1 else posts
+        for number in range(amount):
+            Post.objects.create(
+                author=author,
+                text=f'Пост {number} автора {author.username}',
+                group=data['groups'][number % groups],
+            )
+        for reader in data['readers']:
+            Follow.objects.create(user=reader, author=author)
+    data['big_post'] = data['authors'][0].posts.first()
+    data['small_post'] = data['authors'][-1].posts.first()
+    for post, amount in ((data['big_post'], comments),
+                         (data['small_post'], 2)):
+        for number in range(amount):
+            Comment.objects.create(post=post,
+                                   author=data['readers'][0],
+                                   text=f'Комментарий {number}')
+    return data
+
+
+class QueryMeter:
+    """Выполняет запросы к страницам и запоминает расход на каждую."""
+
+    def __init__(self):
+        self.rows = []
+
+    def measure(self, name, client, url, method='get', data=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data or {})
+            elapsed = time.perf_counter() - started
+        self.rows.append((name, url, len(queries), elapsed))
+        return response, len(queries)
+
+    def report(self):
+        lines = [f'{"view":<28}{"queries":>8}{"ms":>9}  url']
+        for name, url, queries, elapsed in self.rows:
+            lines.append(
+                f'{name:<28}{queries:>8}{elapsed * 1000:>9.1f}  {url}')
+        return '\n'.join(lines)
+
+
+def logged_in(user):
+    client = Client()
+    client.force_login(user)
+    return client
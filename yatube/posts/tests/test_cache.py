@@ -1,37 +1,299 @@
+import tempfile
+from unittest import mock
+
+from core.cache.instrumented import cache_report
+from core.metrics import reset
+from core.purge import StubPurgeServer
+from core.routers import pin_primary, use_replicas
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.db import OperationalError, connection, transaction
+from django.test import Client, TransactionTestCase, override_settings
 from django.urls import reverse
 
-from ..models import Post
+from ..caching import (DEGRADED_HEADER, article_key, get_generations,
+                       replica_may_lag)
+from ..models import Comment, Follow, Group, Post
+from ..search import SQLiteFTSBackend
 
 User = get_user_model()
 
 
-class CacheTests(TestCase):
-    @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
-        cls.user = User.objects.create_user(username='Saycoron')
+class CommittedTestCase(TransactionTestCase):
+    """Тесты с настоящими коммитами: кэш сбрасывается в on_commit."""
+
+    def tearDown(self):
+        # flush после теста не трогает виртуальную таблицу поиска.
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLiteFTSBackend.table}')
+
 
+class CacheTests(CommittedTestCase):
     def setUp(self):
-        self.guest_client = Client()
         cache.clear()
-
-    def test_cache(self):
-        first_response = self.guest_client.get(reverse('posts:index'))
-        post = Post.objects.create(
+        self.user = User.objects.create_user(username='Saycoron')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
             author=self.user,
             text='Тестовый пост достаточной длины',
+            group=self.group,
         )
+        self.guest_client = Client()
+
+    def test_cache(self):
+        """Страница берётся из кэша, пока посты не менялись."""
+        first_response = self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
         second_response = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(first_response.content, second_response.content)
         cache.clear()
         third_response = self.guest_client.get(reverse('posts:index'))
         self.assertNotEqual(first_response.content, third_response.content)
+
+    def test_listings_are_invalidated_by_writes(self):
+        """Новый и удалённый пост сразу видны на страницах списков."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'Saycoron'}),
+        )
+        for page in pages:
+            self.guest_client.get(page)
+        post = Post.objects.create(
+            author=self.user,
+            text='Свежий пост',
+            group=self.group,
+        )
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertIn(post,
+                              self.guest_client.get(page).context['page_obj'])
         post.delete()
-        fourth_response = self.guest_client.get(reverse('posts:index'))
-        self.assertEqual(third_response.content, fourth_response.content)
-        cache.clear()
-        fifth_response = self.guest_client.get(reverse('posts:index'))
-        self.assertNotEqual(fifth_response.content, fourth_response.content)
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertIn('page_obj', self.guest_client.get(page).context)
+
+    def test_generation_bumped_after_commit(self):
+        """Поколение сдвигается только после коммита транзакции."""
+        before = get_generations(['index'])
+        with transaction.atomic():
+            Post.objects.create(author=self.user, text='Пост в транзакции')
+            self.assertEqual(get_generations(['index']), before)
+        self.assertNotEqual(get_generations(['index']), before)
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_replica_pages_not_stored_after_write(self):
+        """Страница, прочитанная из реплики сразу после записи,
+        не сохраняется под новым поколением."""
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertFalse(replica_may_lag(['index']))
+        with use_replicas():
+            self.assertTrue(replica_may_lag(['index']))
+            self.assertFalse(replica_may_lag(['group:other']))
+            with pin_primary():
+                self.assertFalse(replica_may_lag(['index']))
+
+    def test_post_moved_to_another_group_leaves_old_group(self):
+        """Пост, перенесённый в другую группу, пропадает со старой."""
+        url = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        self.guest_client.get(url)
+        self.post.group = Group.objects.create(
+            title='Другая группа',
+            slug='another-slug',
+            description='Другое описание',
+        )
+        self.post.save()
+        self.assertNotIn(self.post,
+                         self.guest_client.get(url).context['page_obj'])
+
+    def test_comment_does_not_invalidate_listing(self):
+        """Комментарий не сбрасывает кэш страниц со списками."""
+        self.guest_client.get(reverse('posts:index'))
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertTemplateNotUsed(response, 'posts/index.html')
+
+    def test_article_fragments_are_cached(self):
+        """Фрагменты постов кэшируются и обновляются при правке поста."""
+        url = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        self.guest_client.get(url)
+        self.assertIsNotNone(cache.get(article_key(self.post, False)))
+        self.post.text = 'Отредактированный пост'
+        self.post.save()
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Отредактированный пост')
+        self.assertNotContains(
+            self.guest_client.get(reverse('posts:index')),
+            'подробная информация')
+
+    def test_previous_page_when_database_fails(self):
+        """Если база не отвечает, отдаётся прежняя страница с пометкой."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(author=self.user, text='Новый пост')
+        with mock.patch('posts.views.post_paginator',
+                        side_effect=OperationalError('database is locked')):
+            response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response[DEGRADED_HEADER], 'error')
+        self.assertNotContains(response, 'Новый пост')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIsNone(self.guest_client.get(url).get(DEGRADED_HEADER))
+
+    def test_not_modified(self):
+        """Повторный запрос без изменений получает 304 без шаблона."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'Saycoron'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        etags = {page: self.guest_client.get(page)['ETag'] for page in pages}
+        for page in pages:
+            with self.subTest(page=page):
+                with self.assertNumQueries(
+                        1 if 'posts/' in page else 0):
+                    response = self.guest_client.get(
+                        page, HTTP_IF_NONE_MATCH=etags[page])
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+        Post.objects.create(author=self.user, text='Новый', group=self.group)
+        for page in pages:
+            with self.subTest(page=page):
+                response = self.guest_client.get(
+                    page, HTTP_IF_NONE_MATCH=etags[page])
+                self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_comments_and_user(self):
+        """ETag поста меняется с комментариями и пользователем."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        self.assertNotEqual(authorized_client.get(url)['ETag'], etag)
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Ок')
+
+    def test_etag_depends_on_group_and_author(self):
+        """ETag поста меняется при правке его группы и автора."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        self.group.title = 'Новое название'
+        self.group.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новое название')
+        self.user.first_name = 'Новое'
+        self.user.last_name = 'Имя'
+        self.user.save()
+        response = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новое Имя')
+
+    def test_login_keeps_etag(self):
+        """Вход пользователя не сбрасывает страницы его профиля."""
+        url = reverse('posts:profile', kwargs={'username': 'Saycoron'})
+        etag = self.guest_client.get(url)['ETag']
+        Client().force_login(self.user)
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_one_page_for_all_users(self):
+        """Одна запись кэша, персональные вставки у каждого свои."""
+        url = reverse('posts:profile', kwargs={'username': 'Saycoron'})
+        follower = User.objects.create_user(username='Follower')
+        Follow.objects.create(user=follower, author=self.user)
+        self.assertNotContains(self.guest_client.get(url), 'Пользователь:')
+        clients = {}
+        for user in (self.user, follower):
+            clients[user] = Client()
+            clients[user].force_login(user)
+        response = clients[follower].get(url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertContains(response, 'Пользователь: Follower')
+        self.assertContains(response, 'Отписаться')
+        response = clients[self.user].get(url)
+        self.assertContains(response, 'Пользователь: Saycoron')
+        self.assertContains(response, 'Подписаться')
+        self.assertNotContains(self.guest_client.get(url), '<!--hole:')
+
+    def test_equivalent_urls_share_entry(self):
+        """Разные записи одной страницы берутся из одной записи кэша."""
+        url = reverse('posts:index')
+        self.assertTemplateUsed(self.guest_client.get(url),
+                                'posts/index.html')
+        for query in ('?page=1', '?page=01', '?page=abc', '?utm_source=x',
+                      '?page=-3&ref=mail', '?cursor=broken'):
+            with self.subTest(query=query):
+                self.assertTemplateNotUsed(
+                    self.guest_client.get(url + query), 'posts/index.html')
+
+    def test_pages_past_the_end_fold_to_last(self):
+        """Номера за последней страницей ведут к её записи в кэше."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        response = self.guest_client.get(url + '?page=5')
+        self.assertEqual(response.context['page_obj'].number, 1)
+        for number in (6, 1000):
+            with self.subTest(number=number):
+                self.assertTemplateNotUsed(
+                    self.guest_client.get(f'{url}?page={number}'),
+                    'posts/index.html')
+
+    def test_index_cache_is_used(self):
+        """Повторные запросы главной попадают в кэш, а не в базу."""
+        url = reverse('posts:index')
+        with tempfile.TemporaryDirectory() as directory, self.settings(
+                METRICS_DIR=directory):
+            reset()
+            for _ in range(3):
+                self.guest_client.get(url)
+            hits = sum(row['hits'] for row in cache_report()['caches']
+                       if row['prefix'] == 'index_page')
+        self.assertEqual(hits, 2)
+
+    def test_proxy_headers(self):
+        """Анонимные страницы помечены ключами и доступны прокси."""
+        url = reverse('posts:group_posts', kwargs={'slug': 'test-slug'})
+        for _ in range(2):
+            response = self.guest_client.get(url)
+            self.assertEqual(response['Surrogate-Key'].split(),
+                             ['group-test-slug', f'post-{self.post.pk}'])
+            self.assertIn('public', response['Cache-Control'])
+            self.assertIn('s-maxage', response['Cache-Control'])
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}))
+        self.assertEqual(response['Surrogate-Key'].split(), [
+            f'author-{self.user.pk}', f'comments-{self.post.pk}',
+            'group-test-slug', f'post-{self.post.pk}'])
+        authorized_client = Client()
+        authorized_client.force_login(self.user)
+        response = authorized_client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('s-maxage', response['Cache-Control'])
+
+
+class PurgeTests(CommittedTestCase):
+    def test_changes_purge_proxy(self):
+        """Изменения постов и комментариев сбрасывают страницы в прокси."""
+        user = User.objects.create_user(username='Saycoron')
+        group = Group.objects.create(title='Группа', slug='test-slug')
+        with StubPurgeServer() as stub, self.settings(
+                PURGE_URL=stub.url, PURGE_INTERVAL=0):
+            post = Post.objects.create(author=user, text='Пост',
+                                       group=group)
+            self.assertEqual(sorted(stub.wait(1)[0]), [
+                f'author-{user.pk}', 'group-test-slug', 'index',
+                f'post-{post.pk}'])
+            Comment.objects.create(post=post, author=user, text='Ок')
+            self.assertEqual(stub.wait(2)[1], [f'comments-{post.pk}'])
+            user.first_name = 'Имя'
+            user.save()
+            self.assertEqual(stub.wait(3)[2], [f'author-{user.pk}'])
@@ -0,0 +1,73 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import AuthorStats, Follow, Post
+
+User = get_user_model()
+
+
+class AuthorStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Saycoron')
+        cls.author = User.objects.create_user(username='Author')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_post_counter_follows_create_and_delete(self):
+        """Счётчик постов меняется при создании и удалении поста."""
+        self.authorized_client.post(reverse('posts:post_create'),
+                                    data={'text': 'Тестовый пост'})
+        self.assertEqual(AuthorStats.objects.get(user=self.user).posts_count,
+                         1)
+        Post.objects.get(author=self.user).delete()
+        self.assertEqual(AuthorStats.objects.get(user=self.user).posts_count,
+                         0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        self.authorized_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}))
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).following_count, 1)
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}))
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).followers_count, 0)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.user).following_count, 0)
+
+    def test_profile_does_not_count_posts(self):
+        """Профиль берёт число постов из счётчика, а не из COUNT(*)."""
+        Post.objects.create(author=self.author, text='Тестовый пост')
+        AuthorStats.objects.filter(user=self.author).update(posts_count=7)
+        response = self.authorized_client.get(reverse(
+            'posts:profile', kwargs={'username': self.author.username}))
+        self.assertEqual(response.context['posts_count'], 7)
+
+    def test_repair_counters_fixes_drift(self):
+        """Команда repair_counters исправляет расхождения."""
+        Post.objects.create(author=self.author, text='Тестовый пост')
+        Follow.objects.create(user=self.user, author=self.author)
+        AuthorStats.objects.filter(user=self.author).update(
+            posts_count=5, followers_count=0)
+        out = StringIO()
+        call_command('repair_counters', '--dry-run', stdout=out)
+        self.assertIn('Найдено расхождений: 1', out.getvalue())
+        self.assertEqual(AuthorStats.objects.get(user=self.author).posts_count,
+                         5)
+        call_command('repair_counters', stdout=StringIO())
+        stats = AuthorStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
@@ -0,0 +1,52 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+
+from ..models import Comment, FeedEntry, Follow, Group, Post, User
+from ..search import SQLiteFTSBackend, get_backend
+
+
+class DatasetCommandsTests(TransactionTestCase):
+    def setUp(self):
+        call_command('generate_dataset', users=20, groups=3, posts=60,
+                     comments=40, follows=4, images=0, seed=1,
+                     stdout=StringIO())
+
+    def tearDown(self):
+        # flush после теста не трогает виртуальную таблицу поиска.
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SQLiteFTSBackend.table}')
+
+    def test_generate_dataset(self):
+        """Генератор создаёт данные и перестраивает производные таблицы."""
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(
+            Post.objects.values('pub_date').distinct().count(), 60)
+        expected = sum(
+            Post.objects.filter(author_id=author_id).count()
+            for author_id in Follow.objects.values_list('author_id',
+                                                        flat=True)
+        )
+        self.assertEqual(FeedEntry.objects.count(), expected)
+        post = Post.objects.first()
+        word = post.text.split()[0]
+        self.assertIn(post.id, get_backend().search(word, 0, 100))
+        out = StringIO()
+        call_command('repair_counters', dry_run=True, stdout=out)
+        self.assertIn('Найдено расхождений: 0', out.getvalue())
+
+    def test_loadtest_reports_percentiles(self):
+        """Нагрузочный прогон выводит перцентили по маршрутам без ошибок."""
+        out = StringIO()
+        call_command('loadtest', requests=40, concurrency=2, seed=1,
+                     stdout=out, stderr=StringIO())
+        lines = out.getvalue().splitlines()
+        self.assertIn('p99', lines[0])
+        rows = [line.split() for line in lines[1:-1]]
+        self.assertEqual(sum(int(row[1]) for row in rows), 40)
+        self.assertTrue(all(row[2] == '0' for row in rows))
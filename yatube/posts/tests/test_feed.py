@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Saycoron')
+        cls.author = User.objects.create_user(username='Author')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост, написанный до подписки',
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_follow_adds_existing_posts_to_feed(self):
+        """Подписка переносит в ленту уже опубликованные посты автора."""
+        self.authorized_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user, post=self.old_post).exists())
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        entry = FeedEntry.objects.get(user=self.user, post=post)
+        self.assertEqual(entry.pub_date, post.pub_date)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_unfollow_trims_feed(self):
+        """Отписка удаляет посты автора из ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}))
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_posts_are_merged_on_read(self):
+        """Посты популярных авторов не раскладываются,
+        но появляются в ленте подписок."""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(FeedEntry.objects.exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [post, self.old_post])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_author_no_longer_popular_is_fanned_out(self):
+        """Когда автор перестаёт быть популярным, его посты
+        раскладываются по лентам оставшихся подписчиков."""
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=other, author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        Follow.objects.get(user=other, author=self.author).delete()
+        self.assertEqual(
+            set(FeedEntry.objects.values_list('user', 'post')),
+            {(self.user.pk, post.pk), (self.user.pk, self.old_post.pk)})
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [post, self.old_post])
+
+    def test_feed_cursor_pagination(self):
+        """Лента подписок листается курсорами по ключу ленты."""
+        Follow.objects.create(user=self.user, author=self.author)
+        for number in range(10):
+            Post.objects.create(author=self.author, text=f'Пост №{number}')
+        first_page = self.authorized_client.get(
+            reverse('posts:follow_index')).context['page_obj']
+        second_page = self.authorized_client.get(
+            reverse('posts:follow_index'),
+            {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(list(second_page), [self.old_post])
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -70,6 +71,29 @@ class PostCreateFormTests(TestCase):
             ).exists()
         )
 
+    @override_settings(THUMBNAIL_PREGENERATE_ASYNC=False)
+    def test_create_post_generates_thumbnails(self):
+        """Миниатюры создаются при сохранении поста, а не при показе."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=(
+                b'\x47\x49\x46\x38\x39\x61\x01\x00'
+                b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+                b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+                b'\x00\x00\x01\x00\x01\x00\x00\x02'
+                b'\x02\x4c\x01\x00\x3b'
+            ),
+            content_type='image/gif'
+        )
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Пост с картинкой', 'image': uploaded},
+            )
+        post = Post.objects.get(text='Пост с картинкой')
+        get_thumbnail.assert_called_once_with(
+            post.image.name, '960x339', crop='center', upscale=True)
+
     def test_edit_post(self):
         """Валидная форма изменяет запись в Post."""
         post = Post.objects.create(
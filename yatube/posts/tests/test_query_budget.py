@@ -0,0 +1,131 @@
+import sys
+
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import urls
+from ..utilities import LAST, encode_cursor
+from .query_budget import QueryMeter, logged_in, seed
+
+# Сколько SQL-запросов может выполнить страница на холодном кэше.
+# В бюджет входят запросы сессии и пользователя у авторизованного клиента,
+# у подписки и отписки — обновление счётчиков, ленты и кэша,
+# у поста — поиск автора для проверки ETag.
+BUDGETS = {
+    'index': 3,
+    'group_posts': 4,
+    'profile': 5,
+    'search': 4,
+    'post_detail': 5,
+    'post_comments': 1,
+    'add_comment': 4,
+    'post_create': 3,
+    'post_edit': 5,
+    'follow_index': 4,
+    'profile_follow': 15,
+    'profile_unfollow': 13,
+}
+
+
+class QueryBudgetTests(TestCase):
+    meter = QueryMeter()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = seed()
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.stdout.write('\n' + cls.meter.report() + '\n')
+        super().tearDownClass()
+
+    def setUp(self):
+        self.big_author, *_, self.small_author = self.data['authors']
+        self.reader = logged_in(self.data['readers'][0])
+        self.author = logged_in(self.big_author)
+
+    def assert_budget(self, name, *requests):
+        """Страница укладывается в бюджет, и он не зависит от данных."""
+        counts = [
+            self.meter.measure(name, *request)[1] for request in requests
+        ]
+        self.assertLessEqual(max(counts), BUDGETS[name],
+                             f'{name}: {counts} запросов')
+        self.assertEqual(len(set(counts)), 1,
+                         f'{name}: число запросов растёт с данными {counts}')
+
+    def test_every_route_has_budget(self):
+        """Для каждого маршрута posts задан бюджет запросов."""
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names, set(BUDGETS))
+
+    def test_listing_budgets(self):
+        group, small_group = self.data['groups']
+        big, small = self.big_author.username, self.small_author.username
+        # Первая страница заполнена целиком, последняя — нет.
+        last = {'cursor': encode_cursor(LAST)}
+        self.assert_budget(
+            'index',
+            (self.reader, reverse('posts:index')),
+            (self.reader, reverse('posts:index'), 'get', last),
+        )
+        self.assert_budget(
+            'group_posts',
+            (self.reader, reverse('posts:group_posts', args=[group.slug])),
+            (self.reader,
+             reverse('posts:group_posts', args=[small_group.slug])),
+        )
+        self.assert_budget(
+            'profile',
+            (self.reader, reverse('posts:profile', args=[big])),
+            (self.reader, reverse('posts:profile', args=[small])),
+        )
+        self.assert_budget(
+            'follow_index',
+            (self.reader, reverse('posts:follow_index')),
+            (self.reader, reverse('posts:follow_index'), 'get', last),
+        )
+        self.assert_budget(
+            'search',
+            (self.reader, reverse('posts:search'), 'get', {'q': 'пост'}),
+            (self.reader, reverse('posts:search'), 'get', {'q': big}),
+        )
+
+    def test_post_budgets(self):
+        big, small = self.data['big_post'].id, self.data['small_post'].id
+        self.assert_budget(
+            'post_detail',
+            (self.reader, reverse('posts:post_detail', args=[big])),
+            (self.reader, reverse('posts:post_detail', args=[small])),
+        )
+        self.assert_budget(
+            'post_comments',
+            (self.reader, reverse('posts:post_comments', args=[big])),
+            (self.reader, reverse('posts:post_comments', args=[small])),
+        )
+        self.assert_budget(
+            'post_edit',
+            (self.author, reverse('posts:post_edit', args=[big])),
+        )
+        self.assert_budget(
+            'post_create',
+            (self.author, reverse('posts:post_create')),
+        )
+
+    def test_write_budgets(self):
+        self.assert_budget(
+            'add_comment',
+            (self.reader,
+             reverse('posts:add_comment', args=[self.data['big_post'].id]),
+             'post', {'text': 'Комментарий'}),
+        )
+        self.assert_budget(
+            'profile_unfollow',
+            (self.reader, reverse('posts:profile_unfollow',
+                                  args=[self.small_author.username])),
+        )
+        self.assert_budget(
+            'profile_follow',
+            (self.reader, reverse('posts:profile_follow',
+                                  args=[self.small_author.username])),
+        )
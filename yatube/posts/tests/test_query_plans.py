@@ -0,0 +1,51 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, User
+from ..query_plans import explain, is_covered, problems, propose_index
+
+
+class QueryPlansTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for number in range(3):
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Пост {number}')
+
+    def test_listings_use_indexes(self):
+        """Ленты постов читаются по индексу, без сортировки на лету."""
+        posts = Post.objects.select_related('author', 'group')
+        comments = Comment.objects.select_related('author').filter(
+            post=self.author.posts.first())
+        for queryset in (
+            posts.order_by('-pub_date', '-id'),
+            posts.filter(group=self.group).order_by('-pub_date', '-id'),
+            posts.filter(author=self.author).order_by('-pub_date', '-id'),
+            comments.order_by('pub_date', 'id'),
+        ):
+            with self.subTest(sql=str(queryset.query)):
+                plan = explain(str(queryset[:10].query))
+                self.assertEqual(problems(plan), ([], []))
+
+    def test_propose_index(self):
+        """Индекс строится из условий на равенство и сортировки."""
+        sql = ('SELECT * FROM "posts_post" WHERE "posts_post"."group_id" = 1 '
+               'ORDER BY "posts_post"."pub_date" DESC, '
+               '"posts_post"."id" DESC LIMIT 10')
+        columns = propose_index(sql, 'posts_post')
+        self.assertEqual(columns, ('group_id', 'pub_date'))
+        self.assertTrue(is_covered('posts_post', columns))
+        self.assertFalse(is_covered('posts_post', ('text',)))
+
+    def test_audit_command_finds_nothing(self):
+        """Аудит на проиндексированной базе не предлагает индексов."""
+        out = StringIO()
+        call_command('audit_queries', repeat=1, seed=1, stdout=out)
+        self.assertIn('Новых индексов не нужно', out.getvalue())
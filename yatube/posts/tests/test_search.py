@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post
+from ..search import LikeSearchBackend, SearchResults
+from ..utilities import SEARCH_MAX_PAGES
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Saycoron', is_staff=True,
+                                            is_superuser=True)
+        cls.cats = Post.objects.create(
+            author=cls.user,
+            text='Кошки любят спать на солнце',
+        )
+        cls.dogs = Post.objects.create(
+            author=cls.user,
+            text='Собаки любят гулять',
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_search_finds_posts_by_words(self):
+        """Поиск находит посты по словам и префиксам."""
+        response = self.client.get(reverse('posts:search'), {'q': 'кошк'})
+        self.assertEqual(list(response.context['page_obj']), [self.cats])
+        response = self.client.get(reverse('posts:search'), {'q': 'любят'})
+        self.assertEqual(set(response.context['page_obj']),
+                         {self.cats, self.dogs})
+
+    def test_index_follows_edits_and_deletes(self):
+        """Индекс поиска обновляется при правке и удалении поста."""
+        post = Post.objects.create(author=self.user, text='Попугаи')
+        post.text = 'Попугаи боятся кошек'
+        post.save()
+        self.assertEqual(SearchResults('кошек').count(), 1)
+        post.delete()
+        self.assertEqual(SearchResults('попугаи').count(), 0)
+
+    def test_query_syntax_is_not_interpreted(self):
+        """Спецсимволы FTS5 во вводе не ломают поиск."""
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': '"кошки" OR NEAR(*'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_query_without_words_finds_nothing(self):
+        """Запрос без слов ничего не находит в обоих бэкендах."""
+        self.assertEqual(SearchResults('%%%').count(), 0)
+        like = SearchResults('%%%', LikeSearchBackend())
+        self.assertEqual(like.count(), 0)
+        self.assertEqual(like[0:10], [])
+
+    def test_pages_without_count(self):
+        """Страницы поиска не считают результаты и не уходят вглубь."""
+        for number in range(10):
+            Post.objects.create(author=self.user, text=f'Кошки {number}')
+        url = reverse('posts:search')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'q': 'кошки'})
+        self.assertTrue(response.context['page_obj'].has_next())
+        self.assertFalse(any('count(' in query['sql'].lower()
+                             for query in queries))
+        response = self.client.get(url, {'q': 'кошки', 'page': 2})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 1)
+        self.assertFalse(page_obj.has_next())
+        response = self.client.get(url, {'q': 'кошки', 'page': 10 ** 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number,
+                         SEARCH_MAX_PAGES)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке использует тот же индекс."""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'собаки'})
+        self.assertEqual(list(response.context['cl'].queryset), [self.dogs])
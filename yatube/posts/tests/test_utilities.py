@@ -1,9 +1,14 @@
+import base64
+import json
+
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from ..models import Group, Post
+from ..caching import canonical_query
+from ..models import Comment, Group, Post
+from ..utilities import decode_cursor
 
 User = get_user_model()
 
@@ -38,3 +43,78 @@ class PaginatorViewsTest(TestCase):
         """Paginator формирует список из 10 постов на второй странице."""
         response = self.client.get(reverse('posts:index') + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_huge_page_number_shows_last_page(self):
+        """Огромный номер страницы ведёт на последнюю, а не в ошибку."""
+        self.client.force_login(self.user)
+        for name in ('posts:index', 'posts:follow_index'):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name),
+                                           {'page': 10 ** 30})
+                self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('posts:index'),
+                                   {'page': 10 ** 30})
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_cursor_pages_cover_all_records(self):
+        """Курсоры ведут на следующую и предыдущую страницы."""
+        first_page = self.client.get(
+            reverse('posts:index')).context['page_obj']
+        second_page = self.client.get(
+            reverse('posts:index'),
+            {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertIsNone(second_page.next_cursor)
+        self.assertFalse(set(first_page) & set(second_page))
+        previous_page = self.client.get(
+            reverse('posts:index'),
+            {'cursor': second_page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertIsNone(previous_page.previous_cursor)
+
+    def test_last_cursor_returns_oldest_records(self):
+        """Курсор последней страницы возвращает самые старые посты."""
+        paginator = self.client.get(
+            reverse('posts:index')).context['page_obj'].paginator
+        last_page = self.client.get(
+            reverse('posts:index'),
+            {'cursor': paginator.last_cursor}).context['page_obj']
+        self.assertEqual(len(last_page), 10)
+        self.assertEqual(last_page[9], Post.objects.order_by('id')[0])
+        self.assertIsNotNone(last_page.previous_cursor)
+        self.assertIsNone(last_page.next_cursor)
+
+    def test_broken_cursor_and_page_fall_back(self):
+        """Испорченный курсор ведёт на первую страницу,
+        а слишком большой номер — на последнюю."""
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': 'не-курсор'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        response = self.client.get(reverse('posts:index'), {'page': 99})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_cursor_with_wrong_key_types(self):
+        """Курсор с ключом неверного типа считается испорченным."""
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        payloads = (
+            ['a', 'foo', 1],
+            ['a', '2020-01-01T00:00:00', 'abc'],
+            ['a', [1], 2],
+            ['b', None, 1],
+            ['a', '2020-13-45T00:00:00', 1],
+            ['a', '2020-01-01T00:00:00+00:00', 2 ** 70],
+            ['l', 1],
+            'ab',
+        )
+        urls = (reverse('posts:index'),
+                reverse('posts:post_comments', args=[self.post.pk]))
+        for payload in payloads:
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(payload).encode()).decode()
+            with self.subTest(payload=payload):
+                self.assertIsNone(decode_cursor(cursor))
+                self.assertEqual(canonical_query({'cursor': cursor}), {})
+                for url in urls:
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 200)
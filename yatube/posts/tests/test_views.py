@@ -259,3 +259,24 @@ class PostsPagesTests(TestCase):
             kwargs={'username': self.user}))
         response = self.authorized_client.get(reverse('posts:follow_index'))
         self.assertNotIn(self.post, response.context['page_obj'])
+
+    def test_post_detail_paginates_comments(self):
+        """Комментарии выводятся страницами, остальные — фрагментами."""
+        commentator = User.objects.create_user(username='Commentator')
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=commentator, text=f'Коммент {i}')
+            for i in range(25)
+        )
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertEqual(comments[0].text, 'Коммент 0')
+        fragment = self.guest_client.get(
+            reverse('posts:post_comments',
+                    kwargs={'post_id': self.post.id}),
+            {'cursor': comments.next_cursor})
+        self.assertTemplateUsed(fragment, 'posts/includes/comment_list.html')
+        self.assertEqual(len(fragment.context['comments']), 5)
+        self.assertIsNone(fragment.context['comments'].next_cursor)
+        self.assertNotContains(fragment, '<html')
@@ -0,0 +1,44 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import get_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Те же размеры и параметры, что у тега thumbnail
+# в posts/includes/article.html и posts/post_detail.html.
+THUMBNAIL_SIZES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+_executor = ThreadPoolExecutor(max_workers=1,
+                               thread_name_prefix='thumbnails')
+
+
+def generate_thumbnails(image):
+    """Создаёт миниатюры всех используемых в шаблонах размеров."""
+    for geometry, options in THUMBNAIL_SIZES:
+        get_thumbnail(image, geometry, **options)
+
+
+def _generate_in_background(name):
+    try:
+        generate_thumbnails(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        close_old_connections()
+
+
+def queue_thumbnails(post):
+    """Ставит создание миниатюр поста в фоновую очередь после коммита."""
+    if not post.image:
+        return
+    name = post.image.name
+    if not settings.THUMBNAIL_PREGENERATE_ASYNC:
+        generate_thumbnails(name)
+        return
+    transaction.on_commit(
+        lambda: _executor.submit(_generate_in_background, name))
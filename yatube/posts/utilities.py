@@ -1,10 +1,223 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+from datetime import datetime
+from itertools import islice
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
 POST_AMOUNT = 10
+COMMENT_AMOUNT = 20
+# Дальше по результатам поиска не листается: каждая следующая страница
+# — это OFFSET по всем совпадениям, отсортированным по релевантности.
+SEARCH_MAX_PAGES = 50
+POST_KEYS = ('pub_date', 'id')
+# Больший OFFSET не выбирается: номер такой страницы заведомо дальше
+# последней, а слишком большое число не помещается в целое SQLite.
+MAX_OFFSET = 2 ** 31
+
+AFTER = 'a'
+BEFORE = 'b'
+LAST = 'l'
+
+
+def encode_cursor(direction, values=()):
+    data = json.dumps([direction, *(
+        value.isoformat() if isinstance(value, datetime) else value
+        for value in values
+    )])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает направление и ключ из курсора или None, если он испорчен.
+
+    Ключи всех списков — (дата, id), поэтому курсор с другими типами
+    значений тоже считается испорченным и ведёт на первую страницу.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, *values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, TypeError, ValueError):
+        return None
+    if direction == LAST and not values:
+        return direction, []
+    if direction not in (AFTER, BEFORE) or len(values) != 2:
+        return None
+    date, pk = values
+    try:
+        date = parse_datetime(date) if isinstance(date, str) else None
+    except ValueError:
+        return None
+    if date is None or type(pk) is not int or not 0 < pk < 2 ** 63:
+        return None
+    return direction, [date, pk]
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу вида (дата, id) без COUNT(*) и OFFSET.
+
+    Страница выбирается курсором: условием на ключ последней или первой
+    записи соседней страницы. Номера страниц (?page=N) поддерживаются
+    для старых ссылок, но дальше навигация идёт по курсорам.
+    """
+
+    def __init__(self, object_list, per_page, keys=POST_KEYS,
+                 descending=True):
+        self.keys = keys
+        self.descending = descending
+        super().__init__(object_list.order_by(*self._ordering(False)),
+                         per_page)
+
+    def _ordering(self, backwards):
+        prefix = '-' if self.descending != backwards else ''
+        return [prefix + key for key in self.keys]
+
+    def _seek(self, values, backwards):
+        """Условие «после ключа» в направлении обхода."""
+        (first, second), (first_value, second_value) = self.keys, values
+        strict = 'lt' if self.descending != backwards else 'gt'
+        return Q(**{f'{first}__{strict}e': first_value}) & (
+            Q(**{f'{first}__{strict}': first_value})
+            | Q(**{f'{second}__{strict}': second_value})
+        )
+
+    def _key(self, obj):
+        return [getattr(obj, key) for key in self.keys]
+
+    @property
+    def last_cursor(self):
+        return encode_cursor(LAST)
+
+    def get_cursor_page(self, cursor=None, number=None):
+        """Возвращает страницу по курсору или, для старых ссылок, по номеру."""
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            if number is not None:
+                return self._numbered_page(number)
+            return self._build_page(self._fetch(), False)
+        direction, values = decoded
+        if direction == LAST:
+            items = self._fetch(backwards=True)
+            return self._build_page(items[:self.per_page][::-1],
+                                    len(items) > self.per_page,
+                                    has_next=False)
+        if direction == BEFORE:
+            items = self._fetch(values, backwards=True)
+            return self._build_page(items[:self.per_page][::-1],
+                                    len(items) > self.per_page,
+                                    has_next=True)
+        return self._build_page(self._fetch(values), True)
+
+    def _fetch(self, values=None, backwards=False):
+        queryset = self.object_list
+        if backwards:
+            queryset = queryset.order_by(*self._ordering(True))
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, backwards))
+        return list(queryset[:self.per_page + 1])
 
+    def _numbered_page(self, number):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        items = (list(self.object_list[offset:offset + self.per_page + 1])
+                 if offset < MAX_OFFSET else [])
+        folded = not items and number > 1
+        if folded:
+            # Номер за пределами списка: как и Paginator.get_page,
+            # отдаём последнюю страницу. COUNT нужен только здесь.
+            number = self.num_pages
+            offset = (number - 1) * self.per_page
+            items = list(self.object_list[offset:offset + self.per_page])
+        page = self._build_page(items, number > 1)
+        page.number = number
+        page.folded = folded
+        return page
 
-def post_paginator(objects_list, request):
-    paginator = Paginator(objects_list, POST_AMOUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    def _build_page(self, items, has_previous, has_next=None):
+        if has_next is None:
+            has_next = len(items) > self.per_page
+            items = items[:self.per_page]
+        page = Page(items, None, self)
+        page.folded = False
+        page.previous_cursor = (
+            encode_cursor(BEFORE, self._key(items[0]))
+            if has_previous and items else None
+        )
+        page.next_cursor = (
+            encode_cursor(AFTER, self._key(items[-1]))
+            if has_next and items else None
+        )
+        return page
+
+
+def post_paginator(objects_list, request, keys=POST_KEYS):
+    paginator = CursorPaginator(objects_list, POST_AMOUNT, keys)
+    page_obj = paginator.get_cursor_page(request.GET.get('cursor'),
+                                         request.GET.get('page'))
+    if page_obj.folded:
+        # Номер страницы больше последнего: запоминаем последний
+        # для нормализации ключей кэша, см. caching.canonical_query.
+        request.last_page = page_obj.number
     return page_obj
+
+
+def comment_paginator(objects_list, request):
+    paginator = CursorPaginator(objects_list, COMMENT_AMOUNT,
+                                descending=False)
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+class SearchPage(Page):
+    """Страница, которая знает о следующей без COUNT(*)."""
+
+    def __init__(self, object_list, number, has_next):
+        super().__init__(object_list, number, None)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def search_paginator(results, request):
+    """Страница результатов поиска по номеру не дальше SEARCH_MAX_PAGES.
+
+    Выбирается на одну запись больше страницы, чтобы узнать, есть ли
+    следующая, поэтому общее число результатов не считается.
+    """
+    try:
+        number = min(max(int(request.GET.get('page')), 1), SEARCH_MAX_PAGES)
+    except (TypeError, ValueError):
+        number = 1
+    offset = (number - 1) * POST_AMOUNT
+    items = results[offset:offset + POST_AMOUNT + 1]
+    has_next = len(items) > POST_AMOUNT and number < SEARCH_MAX_PAGES
+    return SearchPage(items[:POST_AMOUNT], number, has_next)
+
+
+def bulk_create_in_batches(model, objects, batch_size, **kwargs):
+    """bulk_create, который не собирает все объекты в память сразу.
+
+    QuerySet.bulk_create превращает генератор в список, поэтому для
+    миллионов строк объекты передаются ему порциями по batch_size.
+    Размер одного INSERT Django подбирает сам под ограничения базы.
+    """
+    objects = iter(objects)
+    created = 0
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            return created
+        model.objects.bulk_create(batch, **kwargs)
+        created += len(batch)
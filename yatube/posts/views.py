@@ -1,17 +1,27 @@
+from core.proxy import surrogate_keys, tag
+from core.routers import pins_primary
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from .caching import cache_listing, conditional
+from .counters import get_stats
+from .feed import FEED_KEYS, follow_feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utilities import post_paginator
+from .models import Comment, Follow, Group, Post, User
+from .search import SearchResults
+from .thumbnails import queue_thumbnails
+from .utilities import (comment_paginator, post_paginator,
+                        search_paginator)
 
-POST_AMOUNT = 10
 
-
-@cache_page(20, key_prefix='index_page')
+@conditional('index')
+@cache_listing('index_page', 'index')
+@surrogate_keys
 def index(request):
-    post_list = Post.objects.select_related()
+    tag(request, 'index')
+    post_list = Post.objects.select_related('author', 'group')
     page_obj = post_paginator(post_list, request)
     context = {
         'page_obj': page_obj,
@@ -19,9 +29,13 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@conditional('group:{slug}')
+@cache_listing('group_page', 'group:{slug}')
+@surrogate_keys
 def group_posts(request, slug):
+    tag(request, f'group-{slug}')
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.group_posts.order_by('-pub_date')
+    post_list = group.group_posts.select_related('author', 'group')
     page_obj = post_paginator(post_list, request)
     context = {
         'page_obj': page_obj,
@@ -30,36 +44,62 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional('profile:{username}')
+@cache_listing('profile_page', 'profile:{username}')
+@surrogate_keys
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    author_id = author.id
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user,
-            author=author_id
-        ).exists()
-    else:
-        following = False
-    profile_data = author.posts.all()
-    posts_count = profile_data.count()
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    tag(request, f'author-{author.id}')
+    stats = get_stats(author)
+    profile_data = author.posts.select_related('author', 'group')
     page_obj = post_paginator(profile_data, request)
     context = {
         'page_obj': page_obj,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
         'author': author,
-        'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = search_paginator(SearchResults(query), request)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def post_scope_values(post_id):
+    found = Post.objects.filter(id=post_id).values_list(
+        'author__username', 'group__slug').first()
+    if found is None:
+        return None
+    # У поста без группы область 'group:' никогда не меняется.
+    username, slug = found
+    return {'username': username, 'slug': slug or ''}
+
+
+@conditional('post:{post_id}', 'profile:{username}', 'group:{slug}',
+             lookup=post_scope_values)
+@surrogate_keys
 def post_detail(request, post_id):
     current_post = get_object_or_404(
-        Post.objects.select_related('author', 'group'),
+        Post.objects.select_related('author', 'group', 'author__stats'),
         id=post_id
     )
-    author = current_post.author
-    posts_count = author.posts.count()
-    comments = current_post.comments.all()
+    tag(request, f'post-{post_id}', f'comments-{post_id}',
+        f'author-{current_post.author_id}')
+    if current_post.group_id:
+        tag(request, f'group-{current_post.group.slug}')
+    posts_count = get_stats(current_post.author).posts_count
+    comments = comment_paginator(
+        current_post.comments.select_related('author'), request)
     form = CommentForm()
     context = {
         'current_post': current_post,
@@ -70,6 +110,19 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    comments = comment_paginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        request)
+    if not comments and not Post.objects.filter(id=post_id).exists():
+        raise Http404
+    context = {
+        'comments': comments,
+        'post_id': post_id,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -78,7 +131,9 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
+            queue_thumbnails(post)
         return redirect('posts:profile', username=request.user)
     return render(
         request,
@@ -96,7 +151,9 @@ def post_edit(request, post_id):
                     files=request.FILES or None,
                     instance=post)
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            queue_thumbnails(post)
         return redirect('posts:post_detail', post_id)
     context = {
         'post': post,
@@ -124,26 +181,30 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    following_list = Post.objects.filter(
-        author__following__user=request.user)
-    page_obj = post_paginator(following_list, request)
+    following_list = follow_feed(request.user)
+    page_obj = post_paginator(following_list, request, FEED_KEYS)
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@pins_primary
 def profile_follow(request, username):
     user_to_follow = get_object_or_404(User, username=username)
     author_id = user_to_follow.id
     if author_id != request.user.id:
-        Follow.objects.get_or_create(user=request.user, author_id=author_id)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user,
+                                         author_id=author_id)
     return redirect('posts:follow_index')
 
 
 @login_required
+@pins_primary
 def profile_unfollow(request, username):
     user_to_unfollow = get_object_or_404(User, username=username)
     author_id = user_to_unfollow.id
     follow = Follow.objects.filter(user=request.user, author_id=author_id)
-    follow.delete()
+    with transaction.atomic():
+        follow.delete()
     return redirect('posts:follow_index')
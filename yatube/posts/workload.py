@@ -0,0 +1,74 @@
+"""Смесь запросов к страницам posts для нагрузки и аудита запросов."""
+from django.core.management.base import CommandError
+from django.urls import reverse
+
+from .models import Group, Post, User
+from .search import TOKEN
+
+# Маршрут, его вес в смеси запросов и нужна ли авторизация.
+WORKLOAD = (
+    ('index', 30, False),
+    ('group_posts', 15, False),
+    ('profile', 15, False),
+    ('post_detail', 20, False),
+    ('post_comments', 5, False),
+    ('follow_index', 10, True),
+    ('search', 5, False),
+)
+WRITES = (
+    ('add_comment', 3, True),
+)
+
+
+class Sample:
+    """Случайные группы, авторы и посты, к которым обращаются запросы."""
+
+    def __init__(self, size, rng):
+        self.slugs = self.pick(
+            Group.objects.values_list('slug', flat=True), size, rng)
+        self.usernames = self.pick(
+            User.objects.filter(posts__isnull=False).distinct().values_list(
+                'username', flat=True), size, rng)
+        post_ids = self.pick(Post.objects.values_list('id', flat=True),
+                             size, rng)
+        self.posts = list(Post.objects.filter(id__in=post_ids).order_by(
+            'id').values_list('id', 'text'))
+        reader_ids = self.pick(
+            User.objects.filter(follower__isnull=False).distinct()
+            .values_list('id', flat=True), size, rng)
+        self.readers = list(User.objects.filter(id__in=reader_ids))
+        if not (self.usernames and self.posts):
+            raise CommandError('В базе нет постов: '
+                               'сначала запустите generate_dataset.')
+
+    @staticmethod
+    def pick(values, size, rng):
+        # Выбор через rng, а не order_by('?'), чтобы при одном seed
+        # замеры до и после изменения шли по тем же страницам.
+        values = sorted(values)
+        return rng.sample(values, min(size, len(values)))
+
+    def request(self, route, rng):
+        """Возвращает метод, адрес и данные запроса к маршруту."""
+        post_id, text = rng.choice(self.posts)
+        if route == 'index':
+            return 'get', reverse('posts:index'), {'page': rng.randint(1, 5)}
+        if route == 'group_posts':
+            slug = rng.choice(self.slugs)
+            return 'get', reverse('posts:group_posts', args=[slug]), {}
+        if route == 'profile':
+            username = rng.choice(self.usernames)
+            return 'get', reverse('posts:profile', args=[username]), {}
+        if route == 'post_detail':
+            return 'get', reverse('posts:post_detail', args=[post_id]), {}
+        if route == 'post_comments':
+            return 'get', reverse('posts:post_comments', args=[post_id]), {}
+        if route == 'follow_index':
+            return 'get', reverse('posts:follow_index'), {}
+        if route == 'search':
+            words = TOKEN.findall(text) or ['пост']
+            return 'get', reverse('posts:search'), {'q': rng.choice(words)}
+        if route == 'add_comment':
+            return ('post', reverse('posts:add_comment', args=[post_id]),
+                    {'text': 'Комментарий нагрузочного теста'})
+        raise CommandError(f'Неизвестный маршрут {route}')
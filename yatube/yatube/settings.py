@@ -34,7 +34,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.MemoryProfileMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ProxyCacheMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -49,7 +53,8 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.instrumentation.InstrumentedTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -73,9 +78,43 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Применяются к каждому новому соединению с SQLite. В режиме WAL запись
+# не блокирует чтение, а busy_timeout ждёт блокировку вместо ошибки
+# «database is locked». cache_size в KiB, когда значение отрицательное.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Локальная реплика для чтения — копия основной базы, которую
+# обновляет команда sync_replica. Включается переменной окружения;
+# тесты запускаются без неё.
+REPLICA_DATABASE_PATH = os.environ.get('YATUBE_REPLICA_DB')
+if REPLICA_DATABASE_PATH:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': REPLICA_DATABASE_PATH,
+        # Соединение держит старый файл после подмены копией,
+        # поэтому оно не переживает запрос. Без WAL рядом с репликой
+        # не остаются -wal и -shm от прежнего файла.
+        'CONN_MAX_AGE': 0,
+        'PRAGMAS': {**SQLITE_PRAGMAS, 'journal_mode': 'DELETE'},
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает из основной базы.
+REPLICA_STICKY_SECONDS = 15
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -130,12 +169,102 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш в файле SQLite общий для всех процессов-воркеров на машине,
+# поэтому страницы и поколения не дублируются в каждом процессе.
+# Значения в нём — pickle, поэтому файл должен лежать в каталоге,
+# куда пишет только пользователь приложения: не в общем /tmp.
+# InstrumentedCache считает обращения к нему по префиксам ключей.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.instrumented.InstrumentedCache',
+        'LOCATION': os.getenv('YATUBE_CACHE_LOCATION',
+                              os.path.join(BASE_DIR, 'cache.sqlite3')),
+        'OPTIONS': {
+            'BACKEND': 'core.cache.sqlite.SQLiteCache',
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+# Тесты работают с кэшем во временном каталоге.
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Метрики воркеров складываются в METRICS_DIR раз в
+# METRICS_FLUSH_INTERVAL секунд; снимки, не обновлявшиеся
+# METRICS_RETENTION секунд, удаляются. Без METRICS_TOKEN в заголовке
+# Authorization: Bearer их видят только сотрудники.
+METRICS_DIR = os.getenv('YATUBE_METRICS_DIR',
+                        os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = 5
+METRICS_RETENTION = 60 * 60 * 24 * 7
+METRICS_TOKEN = os.getenv('YATUBE_METRICS_TOKEN')
+
+# Запросы к базе дольше SLOW_QUERY_THRESHOLD секунд и одинаковый SQL,
+# повторённый в запросе N_PLUS_ONE_THRESHOLD раз, пишутся в лог
+# core.instrumentation.
+SLOW_QUERY_THRESHOLD = 0.1
+N_PLUS_ONE_THRESHOLD = 5
+
+# Доля запросов, рендер шаблонов которых профилируется; 0 — выключено.
+TEMPLATE_PROFILE_RATE = float(os.getenv('YATUBE_TEMPLATE_PROFILE_RATE', 0))
+
+# Доля запросов, память которых профилирует tracemalloc; 0 — выключено.
+# Последние MEMORY_PROFILE_ENTRIES профилей хранятся в кэше, у каждого —
+# MEMORY_PROFILE_TOP мест выделения по MEMORY_PROFILE_FRAMES кадрам.
+MEMORY_PROFILE_RATE = float(os.getenv('YATUBE_MEMORY_PROFILE_RATE', 0))
+MEMORY_PROFILE_ENTRIES = 200
+MEMORY_PROFILE_TOP = 10
+MEMORY_PROFILE_FRAMES = 30
 
 INTERNAL_IPS = [
     '127.0.0.1',
 ]
+
+# Авторы с большим числом подписчиков не раскладываются по лентам,
+# их посты подмешиваются в ленту подписок при чтении.
+FEED_FANOUT_LIMIT = 1000
+
+# Страницы со списками постов кэшируются под ключами с поколениями,
+# которые сдвигаются сигналами при изменении постов.
+LISTING_CACHE_TIMEOUT = 60 * 60 * 4
+# Перед общим кэшем стоит LRU процесса; срок его записей короткий.
+LISTING_LOCAL_ENTRIES = 256
+LISTING_LOCAL_TIMEOUT = 5
+# Устаревшую страницу пересобирает один запрос, держа блокировку
+# в общем кэше; без предыдущей версии остальные ждут его до
+# LISTING_BUILD_WAIT секунд.
+LISTING_BUILD_LOCK_TIMEOUT = 30
+LISTING_BUILD_WAIT = 2
+# Через LISTING_SOFT_TIMEOUT секунд страница отдаётся из кэша, а новая
+# собирается в фоне. Если при сборке база падает или не отвечает
+# за LISTING_BUILD_BUDGET секунд, отдаётся предыдущая версия страницы.
+LISTING_SOFT_TIMEOUT = 60 * 5
+LISTING_BUILD_BUDGET = 0.5
+
+# Отрисованные фрагменты постов: ключ меняется при изменении поста.
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Анонимные ответы этих страниц может хранить кэширующий прокси.
+# Страницы помечены суррогатными ключами, и при изменении постов,
+# групп, комментариев и подписок ключи уходят POST-запросом
+# на PURGE_URL пачками до PURGE_BATCH_SIZE ключей.
+PROXY_CACHED_VIEWS = (
+    'posts:index',
+    'posts:group_posts',
+    'posts:profile',
+    'posts:post_detail',
+)
+PROXY_CACHE_TIMEOUT = 60 * 60 * 24
+PURGE_URL = os.getenv('YATUBE_PURGE_URL')
+PURGE_HEADERS = {}
+PURGE_BATCH_SIZE = 256
+PURGE_INTERVAL = 0.2
+PURGE_TIMEOUT = 5
+PURGE_RETRIES = 3
+
+# Миниатюры загруженных картинок создаются в фоне после сохранения поста,
+# чтобы их не строил первый запрос страницы.
+THUMBNAIL_PREGENERATE_ASYNC = True
+
+# Полнотекстовый поиск: FTS5 для SQLite,
+# posts.search.LikeSearchBackend — для баз без FTS5.
+SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'